@@ -10,5 +10,6 @@ setup(
     author='Jared McFarland',
     author_email='jared@mixpanel.com',
     url='https://github.com/mixpanel/mixpanel-utils',
-    python_requires='>=3'
+    python_requires='>=3',
+    install_requires=['urllib3'],
 )
@@ -1,24 +1,29 @@
 import base64
+import codecs
 import csv
 import datetime
 import gzip
 import io
+import itertools
 import logging
+import math
 import os
+import random
 import re
 import shutil
+import threading
 import time
-import urllib.error
 import urllib.parse
 import urllib.request
 import zipfile
-from copy import deepcopy
-from http.client import IncompleteRead
-from inspect import isfunction
-from json.decoder import JSONDecodeError
+from collections.abc import Iterator
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from json.decoder import JSONDecodeError, JSONDecoder
 from multiprocessing import cpu_count
-from multiprocessing.pool import ThreadPool
-from socket import timeout
+from operator import itemgetter
+
+import urllib3
 
 from .paginator import ConcurrentPaginator
 
@@ -27,17 +32,95 @@ try:
 except ImportError:
     import json
 
+try:
+    import orjson
+except ImportError:
+    # If orjson is not installed ujson or the built-in json library will be used instead
+    orjson = None
+
 try:
     import ciso8601
 except ImportError:
     # If ciso8601 is not installed datetime will be used instead
-    pass
+    ciso8601 = None
+
+if orjson is not None:
+    def _json_dumps_bytes(obj):
+        return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS)
+
+    def _json_dumps(obj):
+        return _json_dumps_bytes(obj).decode("utf-8")
+
+    _json_loads = orjson.loads
+else:
+    def _json_dumps_bytes(obj):
+        return json.dumps(obj).encode("utf-8")
+
+    _json_dumps = json.dumps
+    _json_loads = json.loads
+
+# All ISO 8601 timestamps are parsed through _parse_datetime, which returns naive datetimes either way
+if ciso8601 is not None:
+    _parse_datetime = ciso8601.parse_datetime_unaware
+else:
+    def _parse_datetime(value):
+        # fromisoformat only accepts a trailing "Z" from Python 3.11 on
+        if value[-1:] == "Z":
+            value = value[:-1]
+        return datetime.datetime.fromisoformat(value).replace(tzinfo=None)
+
+_SCALAR_PARAM_TYPES = (str, int, float, bool, type(None))
+
+# First characters of anything json.loads can decode (NaN and Infinity included, leading whitespace is allowed)
+_JSON_START_CHARS = frozenset('{["-0123456789tfnNI \t\r\n')
+
+# Amplitude event/profile keys that have a Mixpanel equivalent
+_AMP_TO_MP = {
+    "app_version": "$app_version_string",
+    "os_name": "$os",
+    "os_version": "$os_version",
+    "device_brand": "$brand",
+    "device_manufacturer": "$manufacturer",
+    "device_model": "$model",
+    "carrier": "$carrier",
+    "region": "$region",
+    "city": "$city",
+    "insert_id": "$insert_id",
+    "$insert_id": "$insert_id",
+    "platform": "platform",
+    "dma": "dma",
+    "language": "language",
+    "price": "price",
+    "quantity": "quantity",
+    "revenue": "revenue",
+    "productId": "productId",
+    "revenueType": "revenueType",
+    "location_lat": "location_lat",
+    "location_lng": "location_lng",
+    "idfa": "idfa",
+    "idfv": "idfv",
+    "adid": "adid",
+    "android_id": "android_id",
+    "event_id": "event_id",
+    "session_id": "session_id",
+    "plan": "plan",
+}
+
+
+@lru_cache(maxsize=1024)
+def _encode_scalar_params(items):
+    # items holds (name, str(value)) pairs so that e.g. True and 1 don't share a cache entry
+    return urllib.parse.urlencode(items)
 
 
 class MixpanelUtils(object):
     """An object for querying, importing, exporting and modifying Mixpanel data via their various APIs"""
 
     VERSION = "2.0"
+    # Number of seconds query_engage results are reused for identical queries
+    ENGAGE_CACHE_TTL = 60
+    # Upper bound on the number of profiles held by the query_engage cache, larger results are never cached
+    ENGAGE_CACHE_MAX_PROFILES = 10000
     LOGGER = logging.getLogger(__name__)
     LOGGER.setLevel(logging.WARNING)
     sh = logging.StreamHandler()
@@ -99,6 +182,11 @@ class MixpanelUtils(object):
         self.strict_import = strict_import
         if self.service_account_username is not None:
             assert self.project_id, "project_id required for Service Account authentication!"
+            basic_credentials = f"{self.service_account_username}:{self.api_secret}"
+        else:
+            basic_credentials = f"{self.api_secret}:"
+        # The Authorization header never changes so it is encoded once here instead of on every request
+        self._auth_header = "Basic " + base64.b64encode(basic_credentials.encode("utf-8")).decode("utf-8")
         self.timeout = timeout
         if pool_size is None:
             # Default number of threads is system dependent
@@ -121,6 +209,27 @@ class MixpanelUtils(object):
             "https://mixpanel.com/api" if residency == "us" 
             else f"https://{residency}.mixpanel.com/api"
         )
+        # A single connection pool is shared by every request so connections to the Mixpanel hosts are kept alive
+        # across calls instead of paying a new TCP + TLS handshake each time
+        self._http = urllib3.PoolManager(
+            num_pools=4,
+            maxsize=max(self.pool_size, self.read_pool_size) + 4,
+            block=True,
+            # request() does its own retrying, the pool only follows redirects like urllib did
+            retries=urllib3.Retry(
+                total=None, connect=0, read=0, status=0, other=0, redirect=10, raise_on_redirect=False
+            ),
+        )
+        # The thread pools live as long as the client so back to back operations don't pay thread start-up costs
+        self._write_pool = ThreadPoolExecutor(max_workers=self.pool_size, thread_name_prefix="mp-write")
+        self._read_pool = ThreadPoolExecutor(max_workers=self.read_pool_size, thread_name_prefix="mp-read")
+        # Maps canonical /engage query params to (profile count, serialized profiles, expiry timer), see query_engage
+        self._engage_cache = {}
+        self._engage_cache_lock = threading.Lock()
+        # Open handles for invalid_events.txt / import_backup.txt, kept until the last running import finishes
+        self._failure_files = {}
+        self._failure_files_users = 0
+        self._failure_files_lock = threading.Lock()
         log_level = MixpanelUtils.LOGGER.getEffectiveLevel()
         """ The logger is a singleton for the MixpanelUtils class, so multiple instances of the MixpanelUtils class will use the
         same logger instance. Subsequent instances can upgrade the logging level to debug but they cannot downgrade it.
@@ -130,41 +239,71 @@ class MixpanelUtils(object):
         else:
             MixpanelUtils.LOGGER.setLevel(logging.WARNING)
 
+    def close(self):
+        """Shuts down the thread pools and releases the pooled HTTP connections. The MixpanelUtils object can't be
+        used after calling this method. Using the MixpanelUtils object as a context manager calls this automatically.
+
+        """
+        self._write_pool.shutdown(wait=True)
+        self._read_pool.shutdown(wait=True)
+        self.invalidate_engage_cache()
+        self._close_failure_files()
+        self._http.clear()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
     @staticmethod
     def export_data(
             data, output_file, append_mode=False, format="json", compress=False
     ):
         """Writes and optionally compresses Mixpanel data to disk in json or csv format
 
-        :param data: A list of Mixpanel events or People profiles, if format='json', arbitrary json can be exported
+        :param data: A list or iterator of Mixpanel events or People profiles, if format='json', arbitrary json can be
+            exported
         :param output_file: Name of file to write to
-        :param append_mode: Set this to True to append data to an existing file using open() mode 'a+', uses open() mode
-            'w+' when False (Default value = False)
+        :param append_mode: Set this to True to append data to an existing file using open() mode 'ab', uses open() mode
+            'wb' when False. json data is appended as one item per line so repeated appends stay readable
+            (Default value = False)
         :param format:  Output format can be 'json' or 'csv' (Default value = 'json')
-        :param compress:  Option to gzip output (Default value = False)
-        :type data: list
+        :param compress:  Option to gzip output, written to output_file with a .gz extension (Default value = False)
+        :type data: list | iterator
         :type output_file: str
         :type append_mode: bool
         :type format: str
         :type compress: bool
 
         """
-        open_mode = "w+"
-        if append_mode:
-            open_mode = "a+"
-        with open(output_file, open_mode, encoding="utf-8") as output:
-            if format == "json":
-                json.dump(data, output)
-            elif format == "csv":
-                MixpanelUtils._write_items_to_csv(data, output_file)
-            else:
-                MixpanelUtils.LOGGER.warning(
-                    f"Invalid format - must be 'json' or 'csv': format = {format}\nDumping json to {output_file}"
-                )
-                json.dump(data, output)
+        if format not in ("json", "csv"):
+            MixpanelUtils.LOGGER.warning(
+                f"Invalid format - must be 'json' or 'csv': format = {format}\nDumping json to {output_file}"
+            )
+            format = "json"
+        if format == "csv" and isinstance(data, Iterator):
+            # The CSV header is built from every item, so an iterator has to be read in full first
+            data = list(data)
 
+        # Data is streamed straight into the (optionally gzipped) file so we never build the whole output in memory
+        open_mode = "ab" if append_mode else "wb"
         if compress:
-            MixpanelUtils._gzip_file(output_file)
+            if output_file[-3:] != ".gz":
+                output_file = output_file + ".gz"
+            # Level 1 is several times faster than the default 9 for a slightly larger file
+            output = gzip.open(output_file, open_mode, compresslevel=1)
+        else:
+            output = open(output_file, open_mode, buffering=1 << 20)
+
+        with output:
+            if format == "json" and append_mode:
+                MixpanelUtils._write_items_to_json_lines(data, output)
+            elif format == "json":
+                MixpanelUtils._write_items_to_json(data, output)
+            else:
+                with io.TextIOWrapper(output, encoding="utf-8", newline="") as text_output:
+                    MixpanelUtils._write_items_to_csv(data, text_output)
 
     @staticmethod
     def sum_transactions(profile):
@@ -177,14 +316,12 @@ class MixpanelUtils(object):
         :rtype: dict
 
         """
-        total = 0
-        try:
-            transactions = profile["$properties"]["$transactions"]
-            for t in transactions:
-                total = total + t["$amount"]
-        except KeyError:
-            pass
-        return {"Revenue": total}
+        transactions = profile.get("$properties", {}).get("$transactions")
+        if not transactions:
+            return {"Revenue": 0}
+        # math.fsum accumulates in C and avoids the rounding drift of summing floats one at a time. A transaction
+        # without an $amount counts as 0 rather than zeroing the whole profile
+        return {"Revenue": math.fsum(t.get("$amount", 0) for t in transactions)}
 
     def request(
             self,
@@ -203,9 +340,9 @@ class MixpanelUtils(object):
         :param params: dictionary containing the Mixpanel parameters for the API request
         :param method: HTTP method verb: 'GET', 'POST', 'PUT', 'DELETE', 'PATCH'
         :param headers: HTTP request headers dict (Default value = None)
-        :param raw_stream: Return the raw file-like response directly from urlopen, only works when base_url is
-            self.raw_api
-        :param retries: number of times the request has been retried (Default value = 0)
+        :param raw_stream: Return the raw file-like response directly from urllib3 (undecoded) instead of reading
+            the whole body (Default value = False)
+        :param retries: number of times the request has already been retried (Default value = 0)
         :type base_url: str
         :type path_components: list
         :type params: dict
@@ -213,136 +350,113 @@ class MixpanelUtils(object):
         :type headers: dict
         :type raw_stream: bool
         :type retries: int
-        :return: JSON data returned from API
-        :rtype: str
+        :return: The decoded response body, the undecoded file-like urllib3 response if raw_stream is True, or None if
+            the API returned a 4xx error
+        :rtype: str | urllib3.response.HTTPResponse | None
 
         """
-        if retries < self.max_retries:
-            # Add API version to url path if needed
-            if base_url == self.import_api:
-                base = [base_url]
-            else:
-                base = [base_url, str(MixpanelUtils.VERSION)]
-            request_url = "/".join(base + path_components)
-
-            if self.service_account_username:
-                basic_credentials = f"{self.service_account_username}:{self.api_secret}"
-            else:
-                basic_credentials = f"{self.api_secret}:"
-            encoded_credentials = base64.b64encode(basic_credentials.encode("utf-8")).decode("utf-8")
-
-            if headers is None:
-                headers = {}
-            headers["Authorization"] = f"Basic {encoded_credentials}"
-
-            # Set up request url and body based on HTTP method and endpoint
-            if self.service_account_username:
-                params['project_id'] = self.project_id
-            if method == "GET" or method == "DELETE":
-                data = None
-                request_url += "?" + MixpanelUtils._unicode_urlencode(params)
+        # The URL, headers and body are built once and reused by every attempt
+        # Add API version to url path if needed
+        if base_url == self.import_api:
+            base = [base_url]
+        else:
+            base = [base_url, str(MixpanelUtils.VERSION)]
+        request_url = "/".join(base + path_components)
+
+        if headers is None:
+            headers = {}
+        headers["Authorization"] = self._auth_header
+
+        # Set up request url and body based on HTTP method and endpoint
+        if self.service_account_username:
+            params['project_id'] = self.project_id
+        if method == "GET" or method == "DELETE":
+            data = None
+            request_url += "?" + MixpanelUtils._unicode_urlencode(params)
+        else:
+            if "import" in path_components:
+                headers["Content-Type"] = "application/x-ndjson"
+                headers["Content-Encoding"] = "gzip"
+                data = params["data"]
+                query_params = {}
+                if self.strict_import:
+                    query_params["strict"] = 1
+                if self.service_account_username:
+                    query_params["project_id"] = self.project_id
+                if query_params:
+                    request_url += "?" + MixpanelUtils._unicode_urlencode(query_params)
             else:
-                if "import" in path_components:
-                    headers["Content-Type"] = "application/json"
-                    data = params["data"]
-                    query_params = {}
-                    if self.strict_import:
-                        query_params["strict"] = 1
-                    if self.service_account_username:
-                        query_params["project_id"] = self.project_id
-                    if query_params:
-                        request_url += "?" + MixpanelUtils._unicode_urlencode(query_params)
-                else:
-                    data = MixpanelUtils._unicode_urlencode(params).encode("utf-8")
-                    if "engage" in path_components:
-                        request_url += "?verbose=1"
-                # Uncomment the line below to debug log the request body data
-                # MixpanelUtils.LOGGER.debug(f"{method} data: {data}")
-            MixpanelUtils.LOGGER.debug(f"Request Method: {method}")
-            MixpanelUtils.LOGGER.debug(f"Request URL: {request_url}")
-
-            request = urllib.request.Request(request_url, data, headers, method=method)
-            MixpanelUtils.LOGGER.debug(f"Request Headers: {json.dumps(headers)}")
-
+                headers["Content-Type"] = "application/x-www-form-urlencoded"
+                data = MixpanelUtils._unicode_urlencode(params).encode("utf-8")
+                if "engage" in path_components:
+                    request_url += "?verbose=1"
+            # Uncomment the line below to debug log the request body data
+            # MixpanelUtils.LOGGER.debug("%s data: %s", method, data)
+        if MixpanelUtils.LOGGER.isEnabledFor(logging.DEBUG):
+            MixpanelUtils.LOGGER.debug("Request Method: %s", method)
+            MixpanelUtils.LOGGER.debug("Request URL: %s", request_url)
+            MixpanelUtils.LOGGER.debug("Request Headers: %s", _json_dumps(headers))
+
+        # Raw streams are handed back undecoded so gzipped exports can be written to disk as-is
+        stream = raw_stream
+        for attempt in range(retries, self.max_retries):
+            if attempt > retries:
+                # Truncated exponential backoff with jitter so retries don't all hit the API at the same moment
+                time.sleep(min(30, 0.5 * (2 ** attempt) + random.random() * 0.25))
             try:
-                response = urllib.request.urlopen(request, timeout=self.timeout)
-                if raw_stream and base_url == self.raw_api:
-                    return response
-            except urllib.error.HTTPError as e:
-                MixpanelUtils.LOGGER.error("The server couldn't fulfill the request.")
-                MixpanelUtils.LOGGER.error(f"HTTP Error Code: {e.code}")
-                MixpanelUtils.LOGGER.error(f"Reason: {e.reason}")
-                if hasattr(e, "read"):
-                    MixpanelUtils.LOGGER.error(f"Response: {e.read().decode('utf-8')}")
-                if e.code >= 500:
-                    # Retry if we get an HTTP 5xx error
-                    MixpanelUtils.LOGGER.warning(f"Attempting retry #{retries + 1}")
-                    return self.request(
-                        base_url,
-                        path_components,
-                        params,
-                        method=method,
-                        headers=headers,
-                        raw_stream=raw_stream,
-                        retries=retries + 1,
-                    )
-
-            except urllib.error.URLError as e:
-                MixpanelUtils.LOGGER.error("We failed to reach a server.")
-                MixpanelUtils.LOGGER.error(f"Reason: {e.reason}")
-                if hasattr(e, "read"):
-                    MixpanelUtils.LOGGER.error(f"Response: {e.read()}")
-                MixpanelUtils.LOGGER.warning(f"Attempting retry #{retries + 1}")
-                return self.request(
-                    base_url,
-                    path_components,
-                    params,
-                    method=method,
-                    headers=headers,
-                    raw_stream=raw_stream,
-                    retries=retries + 1,
-                )
-            except timeout:
-                MixpanelUtils.LOGGER.error("The read operation timed out.")
-                self.timeout = self.timeout + 30
-                MixpanelUtils.LOGGER.warning(
-                    f"Increasing timeout to {self.timeout} and attempting retry #{retries + 1}"
-                )
-                return self.request(
-                    base_url,
-                    path_components,
-                    params,
-                    method=method,
+                response = self._http.request(
+                    method,
+                    request_url,
+                    body=data,
                     headers=headers,
-                    raw_stream=raw_stream,
-                    retries=retries + 1,
+                    timeout=self.timeout,
+                    preload_content=not stream,
+                    decode_content=not stream,
                 )
-            else:
-                try:
-                    # If the response is gzipped we go ahead and decompress
-                    if response.info().get("Content-Encoding") == "gzip":
-                        response_data = gzip.decompress(response.read())
-                    else:
-                        response_data = response.read()
-                    return response_data.decode("utf-8")
-                except IncompleteRead:
-                    MixpanelUtils.LOGGER.error(
-                        f"Response data is incomplete. Attempting retry #{retries + 1}"
+            except urllib3.exceptions.HTTPError as e:
+                # With the pool's retries used up the underlying error arrives wrapped in a MaxRetryError
+                if isinstance(e, urllib3.exceptions.MaxRetryError) and e.reason is not None:
+                    e = e.reason
+                if isinstance(e, urllib3.exceptions.TimeoutError):
+                    # Covers both connect and read timeouts
+                    MixpanelUtils.LOGGER.error("The read operation timed out.")
+                    self.timeout = self.timeout + 30
+                    MixpanelUtils.LOGGER.warning(
+                        f"Increasing timeout to {self.timeout} and attempting retry #{attempt + 1}"
                     )
-                    return self.request(
-                        base_url,
-                        path_components,
-                        params,
-                        method=method,
-                        headers=headers,
-                        raw_stream=raw_stream,
-                        retries=retries + 1,
-                    )
-        else:
-            MixpanelUtils.LOGGER.error(
-                "Maximum retries reached. Request failed. Try again later."
-            )
-            raise BaseException
+                    continue
+                # Connection failures as well as incomplete reads of the response body end up here
+                MixpanelUtils.LOGGER.error("We failed to reach a server.")
+                MixpanelUtils.LOGGER.error(f"Reason: {e}")
+                MixpanelUtils.LOGGER.warning(f"Attempting retry #{attempt + 1}")
+                continue
+
+            if response.status >= 400:
+                MixpanelUtils.LOGGER.error("The server couldn't fulfill the request.")
+                MixpanelUtils.LOGGER.error(f"HTTP Error Code: {response.status}")
+                MixpanelUtils.LOGGER.error(f"Reason: {response.reason}")
+                if stream:
+                    # Hand the connection back to the pool before retrying, the body has been read for logging
+                    response_data = response.read()
+                    response.release_conn()
+                else:
+                    response_data = response.data
+                MixpanelUtils.LOGGER.error(f"Response: {response_data.decode('utf-8', 'replace')}")
+                if response.status >= 500:
+                    # Retry if we get an HTTP 5xx error
+                    MixpanelUtils.LOGGER.warning(f"Attempting retry #{attempt + 1}")
+                    continue
+                return
+
+            if stream:
+                return response
+            # urllib3 has already decompressed the body if the response was gzipped
+            return response.data.decode("utf-8")
+
+        MixpanelUtils.LOGGER.error(
+            "Maximum retries reached. Request failed. Try again later."
+        )
+        raise BaseException
 
     def people_operation(
             self,
@@ -362,8 +476,8 @@ class MixpanelUtils(object):
         :param operation: A string with name of a Mixpanel People operation, like $set or $delete
         :param value: Can be a static value applied to all profiles or a user-defined function (or lambda) that takes a
             profile as its only parameter and returns the value to use for the operation on the given profile
-        :param profiles: Can be a list of profiles or the name of a file containing a JSON array or CSV of profiles.
-            Alternative to query_params. (Default value = None)
+        :param profiles: Can be a list or iterator of profiles or the name of a file containing a JSON array or CSV of
+            profiles. Alternative to query_params. (Default value = None)
         :param query_params: Parameters to query /engage API. Alternative to profiles param. (Default value = None)
         :param timezone_offset: UTC offset in hours of project timezone setting, used to calculate as_of_timestamp
             parameter for queries that use behaviors. Required if query_params contains behaviors (Default value = None)
@@ -371,7 +485,7 @@ class MixpanelUtils(object):
         :param backup: True to create backup file otherwise False (default)
         :param backup_file: Optional filename to use for the backup file (Default value = None)
         :type operation: str
-        :type profiles: list | str
+        :type profiles: list | str | iterator
         :type query_params: dict
         :type timezone_offset: int | float
         :type ignore_alias: bool
@@ -388,35 +502,46 @@ class MixpanelUtils(object):
             )
             return
 
-        if profiles is not None:
+        if isinstance(profiles, Iterator):
+            # Iterators (like streamed JQL results) are consumed lazily unless the backup needs the full list
+            profiles_list = list(profiles) if backup else profiles
+        elif isinstance(profiles, str) and not backup:
+            # Profiles are read from the file as they are sent, so the whole file never has to fit in memory
+            profiles_list = MixpanelUtils._iter_from_items_filename(profiles)
+        elif profiles is not None:
             profiles_list = MixpanelUtils._list_from_argument(profiles)
-        elif query_params is not None:
+        elif backup:
+            # The backup needs the complete list, so fetch every page up front. If query_params is None all
+            # profiles are fetched
             profiles_list = self.query_engage(
                 query_params, timezone_offset=timezone_offset
             )
         else:
-            # If both profiles and query_params are None just fetch all profiles
-            profiles_list = self.query_engage()
+            # Without a backup, updates for each page are dispatched while the following pages are still being read
+            profiles_list = itertools.chain.from_iterable(
+                self._query_engage_pages(query_params, timezone_offset=timezone_offset)
+            )
+
+        # Set the dynamic flag to True if value is a function (callable also covers functools.partial and other callables)
+        dynamic = callable(value)
 
         if backup:
             if backup_file is None:
                 backup_file = "backup_{:.0f}.json".format(time.time())
-
+            # The backup is written in full before any update is sent, so a failed backup aborts the operation before
+            # a single profile has been changed
             self.export_data(profiles_list, backup_file, append_mode=True)
 
-        # Set the dynamic flag to True if value is a function
-        dynamic = isfunction(value)
-
-        self._dispatch_batches(
+        profile_count = self._dispatch_batches(
             self.import_api,
             "engage",
             profiles_list,
-            [{}, self.token, operation, value, ignore_alias, dynamic],
+            (MixpanelUtils._profile_update_template(self.token, ignore_alias), operation, value, dynamic),
+            adaptive=True,
         )
 
-        profile_count = len(profiles_list)
         MixpanelUtils.LOGGER.debug(
-            f"{operation} operation applied to {profile_count} profiles"
+            "%s operation applied to %d profiles", operation, profile_count
         )
         return profile_count
 
@@ -810,28 +935,45 @@ class MixpanelUtils(object):
 
 
         """
-        if profiles is None and query_params is None:
-            query_params = {"selector": '(defined (properties["' + old_name + '"]))'}
-        profile_count = self.people_operation(
-            "$set",
-            lambda p: {new_name: p["$properties"][old_name]},
-            profiles=profiles,
-            query_params=query_params,
-            timezone_offset=timezone_offset,
-            ignore_alias=ignore_alias,
-            backup=backup,
-            backup_file=backup_file,
-        )
-        if unset:
-            self.people_operation(
-                "$unset",
-                [old_name],
-                profiles=profiles,
-                query_params=query_params,
-                timezone_offset=timezone_offset,
+        # Resolve the profiles once so the $set and $unset passes don't each query /engage
+        if profiles is not None:
+            profiles_list = MixpanelUtils._list_from_argument(profiles)
+        else:
+            if query_params is None:
+                query_params = {"selector": '(defined (properties["' + old_name + '"]))'}
+            profiles_list = self.query_engage(query_params, timezone_offset=timezone_offset)
+
+        with ThreadPoolExecutor(max_workers=1) as unset_executor:
+            # $set of new_name and $unset of old_name touch different properties, so the $unset updates can be
+            # sent alongside the $set updates. Renaming a property to itself has to keep the original order
+            concurrent_unset = unset and new_name != old_name
+            if concurrent_unset:
+                unset_future = unset_executor.submit(
+                    self.people_operation,
+                    "$unset",
+                    [old_name],
+                    profiles=profiles_list,
+                    ignore_alias=ignore_alias,
+                    backup=False,
+                )
+            profile_count = self.people_operation(
+                "$set",
+                lambda p: {new_name: p["$properties"][old_name]},
+                profiles=profiles_list,
                 ignore_alias=ignore_alias,
-                backup=False,
+                backup=backup,
+                backup_file=backup_file,
             )
+            if concurrent_unset:
+                unset_future.result()
+            elif unset:
+                self.people_operation(
+                    "$unset",
+                    [old_name],
+                    profiles=profiles_list,
+                    ignore_alias=ignore_alias,
+                    backup=False,
+                )
 
         return profile_count
 
@@ -913,68 +1055,66 @@ class MixpanelUtils(object):
         :rtype: int
 
         """
-        main_reference = {}
+        # Maps each value of prop_to_match to the (last_seen, index, distinct_id, properties) of the newest profile seen
+        # so far
+        winners = {}
+        # Maps each value of prop_to_match to its duplicates, only collected when merge_props is True
+        losers = {}
         update_profiles = []
         delete_profiles = []
 
+        if backup and backup_file is None:
+            backup_file = "backup_{:.0f}.json".format(time.time())
+
         if profiles is not None:
             profiles_list = MixpanelUtils._list_from_argument(profiles)
+            if backup:
+                self.export_data(profiles_list, backup_file, append_mode=True)
         else:
             # Unless the user provides a list of profiles we only look at profiles which have the prop_to_match set
             selector = '(boolean(properties["{}"]) == true)'.format(prop_to_match)
-            profiles_list = self.query_engage({"where": selector})
-
-        if backup:
-            if backup_file is None:
-                backup_file = "backup_{:.0f}.json".format(time.time())
-            self.export_data(profiles_list, backup_file, append_mode=True)
-
-        for profile in profiles_list:
-            try:
-                match_prop = str(profile["$properties"][prop_to_match])
-            except UnicodeError:
-                match_prop = profile["$properties"][prop_to_match].encode("utf-8")
-            except KeyError:
+            pages = self._query_engage_pages({"where": selector})
+            if backup:
+                pages = MixpanelUtils._backup_pages(pages, backup_file)
+            # Profiles are deduplicated page by page so only the winners (and losers, when merging) stay in memory
+            profiles_list = itertools.chain.from_iterable(pages)
+
+        for index, profile in enumerate(profiles_list):
+            props = profile.get("$properties")
+            if not props:
                 continue
-            finally:
-                try:
-                    if not case_sensitive:
-                        match_prop = match_prop.lower()
-                except NameError:
-                    pass
-
-            # Ensure each value for the prop we are matching on has a key pointing to an array in the main_reference
-            if not main_reference.get(match_prop):
-                main_reference[match_prop] = []
-
-            # Append each profile to the array under the key corresponding to the value it has for prop we are matching
-            main_reference[match_prop].append(profile)
-
-        for matching_prop, matching_profiles in main_reference.items():
-            if len(matching_profiles) > 1:
-                matching_profiles.sort(
-                    key=lambda dupe: MixpanelUtils._dt_from_iso(dupe)
-                )
-                # We create a $delete update for each duplicate profile and at the same time create a
-                # $set_once update for the keeper profile by working through duplicates oldest to newest
-                if merge_props:
-                    prop_update = {
-                        "$distinct_id": matching_profiles[-1]["$distinct_id"],
-                        "$properties": {},
-                    }
-                for x in range(len(matching_profiles) - 1):
-                    delete_profiles.append(
-                        {"$distinct_id": matching_profiles[x]["$distinct_id"]}
-                    )
-                    if merge_props:
-                        prop_update["$properties"].update(
-                            matching_profiles[x]["$properties"]
-                        )
-                # Remove $last_seen from any updates to avoid weirdness
-                if merge_props and "$last_seen" in prop_update["$properties"]:
-                    del prop_update["$properties"]["$last_seen"]
-                if merge_props:
-                    update_profiles.append(prop_update)
+            raw = props.get(prop_to_match)
+            if raw is None:
+                continue
+            match_prop = str(raw) if case_sensitive else str(raw).casefold()
+
+            # ISO 8601 $last_seen values sort lexicographically, so they can be compared without parsing. Profiles
+            # without $last_seen compare as oldest and later profiles win ties
+            candidate = (props.get("$last_seen", ""), index, profile.get("$distinct_id"), props)
+            current = winners.get(match_prop)
+            if current is None:
+                winners[match_prop] = candidate
+                continue
+            if candidate[0] >= current[0]:
+                winners[match_prop], loser = candidate, current
+            else:
+                loser = candidate
+            if loser[2] is not None:
+                delete_profiles.append({"$distinct_id": loser[2]})
+            if merge_props:
+                losers.setdefault(match_prop, []).append(loser)
+
+        # We create a $set_once update for each keeper profile by working through its duplicates oldest to newest
+        for matching_prop, duplicates in losers.items():
+            duplicates.sort(key=itemgetter(0, 1))
+            props = {}
+            for duplicate in duplicates:
+                props.update(duplicate[3])
+            # Remove $last_seen from any updates to avoid weirdness
+            props.pop("$last_seen", None)
+            distinct_id = winners[matching_prop][2]
+            if distinct_id is not None:
+                update_profiles.append({"$distinct_id": distinct_id, "$properties": props})
 
         # The "merge" is really just a $set_once call with all of the properties from the deleted profiles
         if merge_props:
@@ -990,7 +1130,7 @@ class MixpanelUtils(object):
             "$delete", "", profiles=delete_profiles, ignore_alias=True, backup=False
         )
 
-    def query_jql(self, script, params=None, format="json"):
+    def query_jql(self, script, params=None, format="json", stream=False):
         """Query the Mixpanel JQL API
 
         https://mixpanel.com/help/reference/jql/api-reference#api/access
@@ -998,10 +1138,14 @@ class MixpanelUtils(object):
         :param script: String containing a JQL script to run
         :param params: Optional dict that will be made available to the script as the params global variable.
         :param format: Output format can be either 'json' or 'csv'
+        :param stream: If True, return a generator that parses the items of the result array as they are read from the
+            response for format 'json', or the raw file-like response for format 'csv', instead of loading the whole
+            response (Default value = False)
         :type script: str
         :type params: dict
         :type format: str
-        :return: query output as json or a csv str
+        :type stream: bool
+        :return: query output as json, a generator of json items or a csv str
 
         """
         query_params = {"script": script, "format": format}
@@ -1010,11 +1154,19 @@ class MixpanelUtils(object):
         if params is not None:
             query_params["params"] = json.dumps(params)
 
+        if stream:
+            response = self.request(
+                self.formatted_api, ["jql"], query_params, method="POST", raw_stream=True
+            )
+            if response is None or format != "json":
+                return response
+            return MixpanelUtils._iter_json_array_response(response)
+
         response = self.request(
             self.formatted_api, ["jql"], query_params, method="POST"
         )
-        if format == "json":
-            return json.loads(response)
+        if format == "json" and response is not None:
+            return _json_loads(response)
         else:
             return response
 
@@ -1053,15 +1205,20 @@ class MixpanelUtils(object):
         :rtype: int
 
         """
-
-        jql_data = self.query_jql(jql_script, jql_params)
-
         if backup:
             if backup_file is None:
                 backup_file = "backup_{:.0f}.json".format(time.time())
             # backs up ALL profiles, not just those affected by the JQL since jql_data might not contain full profiles
             self.export_people(backup_file)
 
+        # The JQL result is read in full (with request()'s retries) before any update is sent, so a dropped connection
+        # can't leave the operation half applied
+        jql_data = self.query_jql(jql_script, jql_params)
+        if not isinstance(jql_data, list):
+            # Without this check people_operation would fall back to updating every profile in the project
+            MixpanelUtils.LOGGER.error(f"JQL query failed, no People updates were sent. Result: {jql_data}")
+            return
+
         return self.people_operation(
             people_operation,
             update_value,
@@ -1130,17 +1287,18 @@ class MixpanelUtils(object):
         :type compress: bool
 
         """
-        events = self.query_jql_events(
+        self._stream_jql_items_to_file(
+            output_file,
+            format,
+            compress,
+            "events",
             from_date=from_date,
             to_date=to_date,
             event_selectors=event_selectors,
             timezone_offset=timezone_offset,
             output_properties=output_properties,
-            format=format,
         )
 
-        self._export_jql_items(events, output_file, format=format, compress=compress)
-
     def export_jql_people(
             self,
             output_file,
@@ -1164,14 +1322,13 @@ class MixpanelUtils(object):
         :type compress: bool
 
         """
-        profiles = self.query_jql_people(
+        self._stream_jql_items_to_file(
+            output_file,
+            format,
+            compress,
+            "people",
             user_selectors=user_selectors,
             output_properties=output_properties,
-            format=format,
-        )
-
-        self._export_jql_items(
-            profiles, output_file=output_file, format=format, compress=compress
         )
 
     def query_jql_events(
@@ -1247,31 +1404,50 @@ class MixpanelUtils(object):
         :rtype: list
 
         """
-        headers = {}
-        if add_gzip_header:
-            headers = {"Accept-encoding": "gzip"}
-        response = self.request(
-            self.raw_api, ["export"], params, headers=headers, raw_stream=raw_stream
-        )
-        if response != "":
+        # The response is always streamed so events are parsed while the rest of the export is still downloading
+        for attempt in range(self.max_retries):
+            headers = {}
+            if add_gzip_header:
+                headers = {"Accept-encoding": "gzip"}
+            response = self.request(
+                self.raw_api, ["export"], params, headers=headers, raw_stream=True
+            )
+            if response is None:
+                MixpanelUtils.LOGGER.error("Error querying /export API")
+                return
             if raw_stream:
                 return response
-            else:
-                try:
-                    file_like_object = io.StringIO(response.strip())
-                except TypeError:
-                    MixpanelUtils.LOGGER.error(
-                        "Error querying /export API", exc_info=True
-                    )
-                    return
-                raw_data = file_like_object.getvalue().split("\n")
-                events = []
-                for line in raw_data:
-                    events.append(json.loads(line))
-                return events
-        else:
-            MixpanelUtils.LOGGER.warning("/export API response empty")
-            return []
+            try:
+                events = MixpanelUtils._events_from_export_response(response)
+            except urllib3.exceptions.HTTPError as e:
+                # The connection dropped part way through the body, start the export over
+                MixpanelUtils.LOGGER.error(f"Error reading /export response: {e}")
+                MixpanelUtils.LOGGER.warning(f"Attempting retry #{attempt + 1}")
+                continue
+            if not events:
+                MixpanelUtils.LOGGER.warning("/export API response empty")
+            return events
+
+        MixpanelUtils.LOGGER.error(
+            "Maximum retries reached. Request failed. Try again later."
+        )
+        raise BaseException
+
+    @staticmethod
+    def _events_from_export_response(response):
+        """Parses a streamed /export response, which is newline delimited JSON, one line at a time
+
+        :param response: A raw urllib3 response from the /export API, optionally gzip encoded
+        :type response: urllib3.response.HTTPResponse
+        :return: A list of Mixpanel event dicts
+        :rtype: list
+
+        """
+        try:
+            # Iterating a urllib3 response yields its lines, decompressed if the body is gzip encoded
+            return [_json_loads(line) for line in response if not line.isspace()]
+        finally:
+            response.release_conn()
 
     def query_engage(self, params=None, timezone_offset=None):
         """Queries the /engage API and returns a list of Mixpanel People profile dicts
@@ -1288,6 +1464,111 @@ class MixpanelUtils(object):
         :return: A list of Mixpanel People profile dicts
         :rtype: list
 
+        """
+        params = MixpanelUtils._prep_engage_params(params, timezone_offset)
+        if "behaviors" in params:
+            # as_of_timestamp changes on every call so these queries are never cached
+            return self._engage_paginator().fetch_all(params)
+
+        # Identical queries made within ENGAGE_CACHE_TTL seconds reuse the earlier result. The cache is cleared
+        # whenever updates are sent, so results never predate this client's own writes. Results are kept serialized so
+        # every caller gets its own profile dicts
+        key = json.dumps(params, sort_keys=True)
+        with self._engage_cache_lock:
+            cached = self._engage_cache.get(key)
+        if cached is not None:
+            return _json_loads(cached[1])
+
+        profiles = self._engage_paginator().fetch_all(params)
+        if len(profiles) <= MixpanelUtils.ENGAGE_CACHE_MAX_PROFILES:
+            self._cache_engage_result(key, profiles)
+        return profiles
+
+    def _cache_engage_result(self, key, profiles):
+        """Stores a query_engage result for ENGAGE_CACHE_TTL seconds, evicting the oldest entries to stay within
+        ENGAGE_CACHE_MAX_PROFILES
+
+        :param key: The canonical query params
+        :param profiles: The profiles returned for the query
+        :type key: str
+        :type profiles: list
+
+        """
+        # Entries are dropped by a timer when they expire, not just when the next query happens to look at them
+        timer = threading.Timer(MixpanelUtils.ENGAGE_CACHE_TTL, self._expire_engage_cache_entry, (key,))
+        timer.daemon = True
+        entry = (len(profiles), _json_dumps_bytes(profiles), timer)
+        with self._engage_cache_lock:
+            self._pop_engage_cache_entry(key)
+            cached_count = sum(cached[0] for cached in self._engage_cache.values())
+            # dicts keep insertion order, so the first entries are the oldest
+            for cached_key in list(self._engage_cache):
+                if cached_count + entry[0] <= MixpanelUtils.ENGAGE_CACHE_MAX_PROFILES:
+                    break
+                cached_count -= self._pop_engage_cache_entry(cached_key)[0]
+            self._engage_cache[key] = entry
+            timer.start()
+
+    def _expire_engage_cache_entry(self, key):
+        with self._engage_cache_lock:
+            entry = self._engage_cache.get(key)
+            if entry is not None and entry[2] is threading.current_thread():
+                del self._engage_cache[key]
+
+    def _pop_engage_cache_entry(self, key):
+        # Callers must hold _engage_cache_lock
+        entry = self._engage_cache.pop(key, None)
+        if entry is not None:
+            entry[2].cancel()
+        return entry
+
+    def invalidate_engage_cache(self):
+        """Clears the cached query_engage results so the next query fetches fresh profiles from the /engage API"""
+        with self._engage_cache_lock:
+            for key in list(self._engage_cache):
+                self._pop_engage_cache_entry(key)
+
+    def _query_engage_pages(self, params=None, timezone_offset=None):
+        """Queries the /engage API like query_engage, but yields each page's list of profiles as soon as it arrives
+
+        :param params: Parameters to use for the /engage API request. Defaults to returning all profiles.
+            (Default value = None)
+        :param timezone_offset: UTC offset in hours of project timezone setting. Required if params contains behaviors
+            (Default value = None)
+        :type params: dict
+        :type timezone_offset: int | float
+        :raise RuntimeError: Raises Runtime error if params include behaviors and timezone_offset is None
+        :return: A generator of lists of Mixpanel People profile dicts
+        :rtype: generator
+
+        """
+        # Validate the params before the generator is created so errors surface at call time
+        params = MixpanelUtils._prep_engage_params(params, timezone_offset)
+        return self._engage_paginator().iter_pages(params)
+
+    def _engage_paginator(self):
+        """Returns a ConcurrentPaginator for the /engage API that fetches pages on the read pool
+
+        :return: A ConcurrentPaginator wrapping _get_engage_page
+        :rtype: ConcurrentPaginator
+
+        """
+        return ConcurrentPaginator(
+            self._get_engage_page, concurrency=self.read_pool_size, executor=self._read_pool
+        )
+
+    @staticmethod
+    def _prep_engage_params(params, timezone_offset):
+        """Validates /engage query parameters and adds as_of_timestamp when the query uses behaviors
+
+        :param params: Parameters to use for the /engage API request
+        :param timezone_offset: UTC offset in hours of project timezone setting
+        :type params: dict
+        :type timezone_offset: int | float
+        :raise RuntimeError: Raises Runtime error if params include behaviors and timezone_offset is None
+        :return: The (possibly updated) params dict
+        :rtype: dict
+
         """
         if params is None:
             params = {}
@@ -1295,11 +1576,7 @@ class MixpanelUtils(object):
             raise RuntimeError("timezone_offset required if params include behaviors")
         elif "behaviors" in params:
             params["as_of_timestamp"] = int(int(time.time()) + (timezone_offset * 3600))
-
-        engage_paginator = ConcurrentPaginator(
-            self._get_engage_page, concurrency=self.read_pool_size
-        )
-        return engage_paginator.fetch_all(params)
+        return params
 
     def export_events(
             self,
@@ -1311,7 +1588,7 @@ class MixpanelUtils(object):
             compress=False,
             request_per_day=False,
             raw_stream=False,
-            buffer_size=1024,
+            buffer_size=1 << 20,
     ):
         """Queries the /export API and writes the Mixpanel event data to disk as a JSON or CSV file. Optionally gzip file.
 
@@ -1328,7 +1605,7 @@ class MixpanelUtils(object):
             (Default value = False)
         :param raw_stream: Option to stream the newline delimited JSON response directly to output_file. If True, format
             , timezone_offset and compress arguments are ignored (Default value = False)
-        :param buffer_size: Buffer size in bytes to use if raw_stream is True (Default value = 1024)
+        :param buffer_size: Buffer size in bytes to use if raw_stream is True (Default value = 1048576)
         :type output_file: str
         :type params: dict
         :type format: str
@@ -1345,59 +1622,90 @@ class MixpanelUtils(object):
         if self.timeout == 120:
             self.timeout = 1200
 
-        date_format = "%Y-%m-%d"
-        request_count = 0
-        if request_per_day:
-            f = datetime.datetime.strptime(params["from_date"], date_format)
-            t = datetime.datetime.strptime(params["to_date"], date_format)
-            delta = t - f
-            request_count = delta.days
-
-        for x in range(request_count + 1):
-            params_copy = deepcopy(params)
-            current_file = output_file
-
-            if request_per_day:
-                d = time.strptime(params["from_date"], date_format)
-                current_day = (
-                        datetime.date(d.tm_year, d.tm_mon, d.tm_mday)
-                        + datetime.timedelta(x)
-                ).strftime(date_format)
-                file_components = output_file.split(".")
-                current_file = file_components[0] + "_" + current_day
-                if len(file_components) > 1:
-                    current_file = current_file + "." + file_components[1]
-                params_copy["from_date"] = current_day
-                params_copy["to_date"] = current_day
+        # Convert timezone_offset from hours to seconds once, rather than for every request
+        offset_seconds = timezone_offset * 3600 if timezone_offset is not None else None
 
-            events = self.query_export(
-                params_copy, add_gzip_header=add_gzip_header, raw_stream=raw_stream
+        if not request_per_day:
+            self._export_single_request(
+                params.copy(), output_file, format, offset_seconds, add_gzip_header, compress, raw_stream, buffer_size
             )
-
-            if raw_stream:
-                if add_gzip_header and current_file[-3:] != ".gz":
-                    current_file = current_file + ".gz"
-                with open(current_file, "wb") as fp:
-                    shutil.copyfileobj(events, fp, buffer_size)
-                if not add_gzip_header and compress:
-                    MixpanelUtils._gzip_file(current_file)
-            else:
-                if timezone_offset is not None:
-                    # Convert timezone_offset from hours to seconds
-                    timezone_offset = timezone_offset * 3600
-                    for event in events:
-                        event["properties"]["time"] = int(
-                            event["properties"]["time"] - timezone_offset
-                        )
-
-                MixpanelUtils.export_data(
-                    events, current_file, format=format, compress=compress
+        else:
+            # strptime also accepts dates that aren't zero padded, like 2024-1-5, which fromisoformat rejects before
+            # Python 3.11. The days are formatted with isoformat so each request gets a canonical date
+            f = datetime.datetime.strptime(params["from_date"], "%Y-%m-%d").date()
+            t = datetime.datetime.strptime(params["to_date"], "%Y-%m-%d").date()
+            days = [(f + datetime.timedelta(x)).isoformat() for x in range((t - f).days + 1)]
+            output_root, output_ext = os.path.splitext(output_file)
+
+            def export_day(current_day):
+                # Only top level keys are changed, so a shallow copy is enough
+                params_copy = params.copy()
+                params_copy["from_date"] = current_day
+                params_copy["to_date"] = current_day
+                self._export_single_request(
+                    params_copy,
+                    f"{output_root}_{current_day}{output_ext}",
+                    format,
+                    offset_seconds,
+                    add_gzip_header,
+                    compress,
+                    raw_stream,
+                    buffer_size,
                 )
 
+            # Days are independent of each other, so their (slow) /export requests run concurrently on the read pool
+            list(self._read_pool.map(export_day, days))
+
         # If we modified the default timeout above, restore default setting
         if timeout_backup == 120:
             self.timeout = timeout_backup
 
+    def _export_single_request(
+            self, params, output_file, format, offset_seconds, add_gzip_header, compress, raw_stream, buffer_size
+    ):
+        """Makes a single /export request and writes the events to disk, used by export_events
+
+        :param params: Parameters to use for the /export API request
+        :param output_file: Name of the file to write to
+        :param format: Can be either 'json' or 'csv'
+        :param offset_seconds: Number of seconds to subtract from event timestamps, or None to leave them as is
+        :param add_gzip_header: Adds 'Accept-encoding: gzip' to the request headers
+        :param compress: Option to gzip output_file
+        :param raw_stream: Option to stream the newline delimited JSON response directly to output_file
+        :param buffer_size: Buffer size in bytes to use if raw_stream is True
+        :type params: dict
+        :type output_file: str
+        :type format: str
+        :type offset_seconds: int | float
+        :type add_gzip_header: bool
+        :type compress: bool
+        :type raw_stream: bool
+        :type buffer_size: int
+
+        """
+        events = self.query_export(
+            params, add_gzip_header=add_gzip_header, raw_stream=raw_stream
+        )
+
+        if raw_stream:
+            if add_gzip_header and output_file[-3:] != ".gz":
+                output_file = output_file + ".gz"
+            # Large reads let urllib3 pull the body off the socket in big chunks instead of many small ones
+            with open(output_file, "wb") as fp:
+                shutil.copyfileobj(events, fp, buffer_size)
+            events.release_conn()
+            if not add_gzip_header and compress:
+                MixpanelUtils._gzip_file(output_file)
+        else:
+            if offset_seconds is not None:
+                for event in events:
+                    properties = event["properties"]
+                    properties["time"] = int(properties["time"] - offset_seconds)
+
+            MixpanelUtils.export_data(
+                events, output_file, format=format, compress=compress
+            )
+
     def export_people(
             self,
             output_file,
@@ -1437,7 +1745,7 @@ class MixpanelUtils(object):
         https://mixpanel.com/help/reference/importing-old-events
 
         :param data: A list of Mixpanel event dicts or the name of a file containing a JSON array or CSV of Mixpanel
-            events
+            events. Files are imported as they are read, so a malformed record stops the import part way through
         :param timezone_offset: UTC offset (number of hours) for the project that exported the data. Used to convert the
             event timestamps back to UTC prior to import.
         :type data: list | str
@@ -1453,9 +1761,11 @@ class MixpanelUtils(object):
             https://mixpanel.com/help/reference/http#people-analytics-updates
 
         :param data: A list of Mixpanel People profile dicts (or /engage API update operations) or the name of a file
-            containing a JSON array of Mixpanel People profiles (or /engage API update operations).
+            containing a JSON array of Mixpanel People profiles (or /engage API update operations). Files are imported
+            as they are read, so a malformed record stops the import part way through
         :param ignore_alias: Option to bypass Mixpanel's alias lookup table (Default value = False)
-        :param raw_record_import: Set this to True if data is a list of API update operations (Default value = False)
+        :param raw_record_import: Set this to True if data is a list of API update operations. The operations may also
+            be given as already serialized JSON bytes, which are sent as is (Default value = False)
         :type data: list | str
         :type ignore_alias: bool
 
@@ -1526,17 +1836,18 @@ class MixpanelUtils(object):
         """
         if isinstance(params, dict):
             params = list(params.items())
-        for i, param in enumerate(params):
-            if isinstance(param[1], list):
-                params[i] = (
-                    param[0],
-                    json.dumps(param[1]),
-                )
 
-        result = urllib.parse.urlencode(
-            [(k, isinstance(v, str) and v.encode("utf-8") or v) for k, v in params]
+        # Small scalar-only parameter sets repeat across pages and retries, so their encoding is cached
+        if all(isinstance(v, _SCALAR_PARAM_TYPES) for _, v in params):
+            return _encode_scalar_params(tuple((k, str(v)) for k, v in params))
+
+        # Only list values need to be JSON encoded; urlencode already quotes str values as utf-8
+        if not any(isinstance(v, list) for _, v in params):
+            return urllib.parse.urlencode(params)
+
+        return urllib.parse.urlencode(
+            [(k, json.dumps(v) if isinstance(v, list) else v) for k, v in params]
         )
-        return result
 
     @staticmethod
     def _async_response_handler_callback(response):
@@ -1548,7 +1859,7 @@ class MixpanelUtils(object):
         :type response: str
 
         """
-        MixpanelUtils.LOGGER.debug(f"API Response: {response}")
+        MixpanelUtils.LOGGER.debug("API Response: %s", response)
         if response:
             try:
                 response_data = json.loads(response)
@@ -1574,13 +1885,66 @@ class MixpanelUtils(object):
             MixpanelUtils.LOGGER.warning(f"API response NOT OK: {response}")
 
     @staticmethod
-    def _write_items_to_csv(items, output_file):
+    def _async_future_handler_callback(future):
+        """Passes the result of a finished _send_batch future on to _async_response_handler_callback
+
+        :param future: A finished future wrapping a call to _send_batch
+        :type future: concurrent.futures.Future
+
+        """
+        exception = future.exception()
+        if exception is None:
+            MixpanelUtils._async_response_handler_callback(future.result())
+        else:
+            MixpanelUtils.LOGGER.error("Exception while sending batch", exc_info=exception)
+
+    @staticmethod
+    def _write_items_to_json(items, output):
+        """Writes a list of Mixpanel events or profiles to a binary file object as a JSON array, one item at a time
+
+        :param items: A list or iterator of Mixpanel events or profiles, any other JSON serializable object is written
+            in one go
+        :param output: A file object opened in binary mode
+        :type items: list | iterator
+        :type output: io.BufferedIOBase
+
+        """
+        if not isinstance(items, (list, Iterator)):
+            output.write(_json_dumps_bytes(items))
+            return
+
+        output.write(b"[")
+        for i, item in enumerate(items):
+            if i:
+                output.write(b",")
+            output.write(_json_dumps_bytes(item))
+        output.write(b"]")
+
+    @staticmethod
+    def _write_items_to_json_lines(items, output):
+        """Writes a list of Mixpanel events or profiles to a binary file object as newline delimited JSON
+
+        :param items: A list or iterator of Mixpanel events or profiles, any other JSON serializable object is written
+            as a single line
+        :param output: A file object opened in binary mode
+        :type items: list | iterator
+        :type output: io.BufferedIOBase
+
+        """
+        if not isinstance(items, (list, Iterator)):
+            items = [items]
+        for item in items:
+            output.write(_json_dumps_bytes(item))
+            output.write(b"\n")
+
+    @staticmethod
+    def _write_items_to_csv(items, output):
         """Writes a list of Mixpanel events or profiles to a csv file
 
         :param items: A list of Mixpanel events or profiles
-        :param output_file: A string containing the path and filename to write to
+        :param output: A text file object to write to
         :type items: list
-        :type output_file: str
+        :type output: io.TextIOBase
 
         """
         # Determine whether the items are profiles or events based on the presence of a $distinct_id key
@@ -1595,66 +1959,58 @@ class MixpanelUtils(object):
             MixpanelUtils.LOGGER.error("No data to write!")
             return
 
-        columns = [list(item[props_key].keys()) for item in items]
-        subkeys = set([column for props in columns for column in props])
+        # The header has to be complete before the first row is written, so gather it in a single pass that
+        # doesn't keep a per-item copy of the keys around
+        subkeys = set()
+        for item in items:
+            subkeys.update(item[props_key])
         subkeys = sorted(subkeys)
 
-        # Create the header
-        header = [initial_header_value]
-        for key in subkeys:
-            header.append(key)
-
-        # Create the writer and write the header
-        with open(output_file, "w", encoding="utf-8") as output:
-            writer = csv.writer(output)
-
-            writer.writerow(header)
-
+        def rows():
             for item in items:
-                row = []
-                try:
-                    row.append((item[initial_header_value]))
-                except KeyError:
-                    row.append("")
-
+                props = item[props_key]
+                row = [item.get(initial_header_value, "")]
                 for subkey in subkeys:
-                    try:
-                        field = item[props_key][subkey]
-                        if not isinstance(field, (list, dict)):
-                            row.append(field)
-                        else:
-                            row.append(json.dumps(field))
-                    except KeyError:
-                        row.append("")
-                writer.writerow(row)
+                    field = props.get(subkey, "")
+                    if isinstance(field, (list, dict)):
+                        field = json.dumps(field)
+                    row.append(field)
+                yield row
+
+        writer = csv.writer(output)
+        writer.writerow([initial_header_value] + subkeys)
+        writer.writerows(rows())
 
     @staticmethod
-    def _properties_from_csv_row(row, header, ignored_columns):
+    def _properties_from_csv_row(row, header, ignored_indices):
         """Converts a row from a csv file into a properties dict
 
         :param row: A list containing the csv row data
         :param header: A list containing the column headers (property names)
-        :param ignored_columns: A list of columns (properties) to exclude
+        :param ignored_indices: Indices of the columns (properties) to exclude
         :type row: list
         :type header: list
-        :type ignored_columns: list
+        :type ignored_indices: set
 
         """
         props = {}
+        # Handle a strange edge case where the length of the row is shorter than the length of the header.
+        # We do this to prevent an out of range error.
+        last = len(row) - 1
         for h, prop in enumerate(header):
-            # Handle a strange edge case where the length of the row is longer than the length of the header.
-            # We do this to prevent an out of range error.
-            x = h
-            if x > len(row) - 1:
-                x = len(row) - 1
-            if row[x] == "" or prop in ignored_columns:
+            if h in ignored_indices:
                 continue
-            else:
+            value = row[h if h <= last else last]
+            if value == "":
+                continue
+            # Plain text cells can't be JSON, so skip the (raising) json.loads call for them
+            if value[0] in _JSON_START_CHARS:
                 try:
-                    p = json.loads(row[x])
-                    props[prop] = p
+                    props[prop] = json.loads(value)
+                    continue
                 except (SyntaxError, ValueError):
-                    props[prop] = row[x]
+                    pass
+            props[prop] = value
         return props
 
     @staticmethod
@@ -1701,7 +2057,7 @@ class MixpanelUtils(object):
         props = {"distinct_id": row[distinct_id_index], "time": timestamp}
         props.update(
             MixpanelUtils._properties_from_csv_row(
-                row, header, ["event", "distinct_id", "time"]
+                row, header, {event_index, distinct_id_index, time_index}
             )
         )
         event = {"event": row[event_index], "properties": props}
@@ -1727,7 +2083,9 @@ class MixpanelUtils(object):
             if distinct_id_index is None
             else distinct_id_index
         )
-        props = MixpanelUtils._properties_from_csv_row(row, header, ["$distinct_id"])
+        props = MixpanelUtils._properties_from_csv_row(
+            row, header, {distinct_id_index}
+        )
         profile = {"$distinct_id": row[distinct_id_index], "$properties": props}
         return profile
 
@@ -1765,44 +2123,23 @@ class MixpanelUtils(object):
         """
         item_list = []
         try:
-            with open(filename, "rb") as item_file:
-                # First try loading it as a JSON list
-                item_list = json.load(item_file)
-        except JSONDecodeError as e:
-            if "Expecting value" in str(e):
-                # Based on the error message, try to treat it as CSV
-                with open(filename, "r", encoding="utf-8") as item_file:
-                    reader = csv.reader(item_file)
-                    header = next(reader)
-                    # Determine if the data is events or profiles based on keys in the header.
-                    # NOTE: this will fail if it were profile data with a people property named 'event'
-                    if "event" in header:
-                        event_index = header.index("event")
-                        distinct_id_index = header.index("distinct_id")
-                        time_index = header.index("time")
-                        for row in reader:
-                            event = MixpanelUtils._event_object_from_csv_row(
-                                row, header, event_index, distinct_id_index, time_index
-                            )
-                            item_list.append(event)
-                    elif "$distinct_id" in header:
-                        distinct_id_index = header.index("$distinct_id")
-                        for row in reader:
-                            profile = MixpanelUtils._people_object_from_csv_row(
-                                row, header, distinct_id_index
-                            )
-                            item_list.append(profile)
-                    else:
-                        MixpanelUtils.LOGGER.error(
-                            "Unable to determine Mixpanel data type: CSV header does not contain 'event' or '$distinct_id'"
-                        )
-                        return None
-            else:
-                # Try treating the file as newline delimited JSON objects
-                item_list = []
-                with open(filename, "rb") as item_file:
-                    for item in item_file:
-                        item_list.append(json.loads(item))
+            with open(filename, "rb", buffering=1 << 20) as item_file:
+                first = MixpanelUtils._first_non_space_byte(item_file, filename)
+                if first == b"[":
+                    item_list = json.load(item_file)
+                elif first == b"{":
+                    start = item_file.tell()
+                    try:
+                        # A single (possibly pretty printed) JSON object
+                        item_list = [json.load(item_file)]
+                    except ValueError:
+                        # Newline delimited JSON objects
+                        item_file.seek(start)
+                        item_list = [
+                            json.loads(item) for item in item_file if not item.isspace()
+                        ]
+            if first not in (b"[", b"{"):
+                item_list = list(MixpanelUtils._iter_items_from_csv(filename))
         except IOError:
             MixpanelUtils.LOGGER.error(
                 f"Error loading data from file: {filename}", exc_info=True
@@ -1810,6 +2147,203 @@ class MixpanelUtils(object):
 
         return item_list
 
+    @staticmethod
+    def _first_non_space_byte(item_file, filename):
+        """Returns the first non-whitespace byte of a binary file and positions the file at the start of its content,
+        past any UTF-8 byte order mark. This tells the supported formats apart: '[' starts a JSON array, '{' a JSON
+        object (per line) and a first line of text starting with anything else is treated as a CSV header
+
+        :param item_file: A seekable file opened in binary mode
+        :param filename: Name of the file, used in the error message
+        :type filename: str
+        :return: The first non-whitespace byte, or b"" for an empty file
+        :rtype: bytes
+        :raises ValueError: If the file is neither JSON nor starts with a line of text, e.g. a gzipped file
+
+        """
+        start = len(codecs.BOM_UTF8) if item_file.read(len(codecs.BOM_UTF8)) == codecs.BOM_UTF8 else 0
+        item_file.seek(start)
+        first = item_file.read(1)
+        while first.isspace():
+            first = item_file.read(1)
+        item_file.seek(start)
+        if first not in (b"[", b"{", b""):
+            try:
+                # The incremental decoder doesn't fail on a multi-byte character cut off by the readline limit
+                header = codecs.getincrementaldecoder("utf-8")().decode(item_file.readline(1 << 16))
+            except UnicodeDecodeError:
+                header = None
+            item_file.seek(start)
+            if header is None or not header.rstrip("\r\n").replace("\t", " ").isprintable():
+                raise ValueError(
+                    f"Unrecognized data format in {filename}: expected JSON or CSV with a header row"
+                )
+        return first
+
+    @staticmethod
+    def _iter_from_items_filename(filename):
+        """Lazily yields Mixpanel events or profiles from a file containing a JSON array, newline delimited JSON or CSV,
+        so large files never have to fit in memory at once
+
+        :param filename: Path to a file containing Mixpanel event or People profile data
+        :type filename: str
+        :return: A generator of Mixpanel events or profiles
+        :rtype: generator
+
+        """
+        try:
+            with open(filename, "rb", buffering=1 << 20) as item_file:
+                first = MixpanelUtils._first_non_space_byte(item_file, filename)
+                if first == b"[":
+                    yield from MixpanelUtils._iter_json_array(item_file)
+                    return
+                if first == b"{":
+                    for line in item_file:
+                        if not line.isspace():
+                            yield _json_loads(line)
+                    return
+            yield from MixpanelUtils._iter_items_from_csv(filename)
+        except IOError:
+            MixpanelUtils.LOGGER.error(
+                f"Error loading data from file: {filename}", exc_info=True
+            )
+
+    @staticmethod
+    def _iter_items_from_csv(filename):
+        """Yields Mixpanel events or profiles from a CSV file, one row at a time
+
+        :param filename: Path to a CSV file with a header row containing either 'event' or '$distinct_id'
+        :type filename: str
+        :return: A generator of Mixpanel events or profiles
+        :rtype: generator
+
+        """
+        # utf-8-sig drops the byte order mark spreadsheet programs often write, so it doesn't end up in the header
+        with open(filename, "r", encoding="utf-8-sig", buffering=1 << 20, newline="") as item_file:
+            reader = csv.reader(item_file)
+            header = next(reader, None)
+            if header is None:
+                MixpanelUtils.LOGGER.error(f"Unable to read Mixpanel data: CSV file {filename} is empty")
+                return
+            # Determine if the data is events or profiles based on keys in the header.
+            # NOTE: this will fail if it were profile data with a people property named 'event'
+            if "event" in header:
+                event_index = header.index("event")
+                distinct_id_index = header.index("distinct_id")
+                time_index = header.index("time")
+                for row in reader:
+                    yield MixpanelUtils._event_object_from_csv_row(
+                        row, header, event_index, distinct_id_index, time_index
+                    )
+            elif "$distinct_id" in header:
+                distinct_id_index = header.index("$distinct_id")
+                for row in reader:
+                    yield MixpanelUtils._people_object_from_csv_row(
+                        row, header, distinct_id_index
+                    )
+            else:
+                MixpanelUtils.LOGGER.error(
+                    "Unable to determine Mixpanel data type: CSV header does not contain 'event' or '$distinct_id'"
+                )
+
+    @staticmethod
+    def _iter_json_array_response(response):
+        """Incrementally parses a JSON array from a streamed HTTP response and releases the connection when done
+
+        :param response: A file-like urllib3 response containing a JSON array
+        :type response: urllib3.response.HTTPResponse
+        :return: A generator of the array's elements
+        :rtype: generator
+
+        """
+        try:
+            yield from MixpanelUtils._iter_json_array(response)
+        finally:
+            response.release_conn()
+
+    @staticmethod
+    def _iter_json_array(stream, chunk_size=1 << 16):
+        """Incrementally parses a JSON array from a binary file-like object, yielding one element at a time
+
+        :param stream: A binary file-like object containing a JSON array
+        :param chunk_size: Number of bytes to read at a time (Default value = 65536)
+        :type stream: io.BufferedIOBase
+        :type chunk_size: int
+        :return: A generator of the array's elements
+        :rtype: generator
+
+        """
+        decoder = JSONDecoder()
+        utf8 = codecs.getincrementaldecoder("utf-8")()
+        buffer = ""
+        pos = 0
+        exhausted = False
+
+        def fill(size):
+            nonlocal buffer, pos, exhausted
+            chunk = stream.read(size)
+            exhausted = not chunk
+            buffer = buffer[pos:] + utf8.decode(chunk, final=exhausted)
+            pos = 0
+
+        def next_token():
+            # Skips whitespace and returns the next character, reading more data as needed
+            nonlocal pos
+            while True:
+                while pos < len(buffer) and buffer[pos].isspace():
+                    pos += 1
+                if pos < len(buffer):
+                    return buffer[pos]
+                if exhausted:
+                    raise JSONDecodeError("Unexpected end of JSON array", buffer, pos)
+                fill(chunk_size)
+
+        if next_token() != "[":
+            raise JSONDecodeError("Expecting '['", buffer, pos)
+        pos += 1
+        if next_token() == "]":
+            return
+        while True:
+            next_token()
+            try:
+                item, end = decoder.raw_decode(buffer, pos)
+                # A value that isn't followed by a delimiter yet (e.g. a number cut off mid-chunk) may continue in
+                # the next chunk
+                complete = exhausted or (end < len(buffer) and buffer[end] in ",] \t\r\n")
+            except JSONDecodeError:
+                if exhausted:
+                    raise
+                complete = False
+            if not complete:
+                # Read at least as much again as is buffered so large items aren't re-parsed too often
+                fill(max(chunk_size, len(buffer) - pos))
+                continue
+            pos = end
+            yield item
+            token = next_token()
+            pos += 1
+            if token == "]":
+                return
+            if token != ",":
+                raise JSONDecodeError("Expecting ',' delimiter", buffer, pos - 1)
+
+    @staticmethod
+    def _backup_pages(pages, backup_file):
+        """Appends each page of profiles to a backup file as newline delimited JSON and passes the page through
+
+        :param pages: An iterable of lists of Mixpanel People profiles
+        :param backup_file: Name of the file to append the profiles to
+        :type pages: iterable
+        :type backup_file: str
+        :return: A generator yielding the pages unchanged once they are written
+        :rtype: generator
+
+        """
+        with open(backup_file, "ab") as backup:
+            for page in pages:
+                backup.write(b"".join(_json_dumps_bytes(profile) + b"\n" for profile in page))
+                yield page
+
     @staticmethod
     def _gzip_file(filename):
         """gzip an existing file
@@ -1818,28 +2352,27 @@ class MixpanelUtils(object):
         :type filename: str
 
         """
-        gzip_filename = filename
-        remove = False
-        if filename[-3:] != ".gz":
-            gzip_filename = filename + ".gz"
-            remove = True
+        in_place = filename[-3:] == ".gz"
+        # Compressing in place would truncate the source before it is read, so go through a temporary file
+        gzip_filename = filename + ".tmp" if in_place else filename + ".gz"
         with open(filename, "rb") as f_in:
-            with gzip.open(gzip_filename, "wb") as f_out:
-                shutil.copyfileobj(f_in, f_out)
-        if remove:
+            with gzip.open(gzip_filename, "wb", compresslevel=1) as f_out:
+                shutil.copyfileobj(f_in, f_out, length=1 << 20)
+        if in_place:
+            os.replace(gzip_filename, filename)
+        else:
             os.remove(filename)
 
-    @staticmethod
-    def _prep_event_for_import(event, token, timezone_offset):
+    def _prep_event_for_import(self, event, token, offset_seconds):
         """Takes an event dict and modifies it to meet the Mixpanel /import HTTP spec or dumps it to disk if it is invalid
 
         :param event: A Mixpanel event dict
         :param token: A Mixpanel project token
-        :param timezone_offset: UTC offset (number of hours) of the timezone setting for the project that exported the
+        :param offset_seconds: UTC offset (number of seconds) of the timezone setting for the project that exported the
             data. Needed to convert the timestamp back to UTC prior to import.
         :type event: dict
         :type token: str
-        :type timezone_offset: int | float
+        :type offset_seconds: int | float
         :return: Mixpanel event dict with token added and timestamp adjusted to UTC
         :rtype: dict
 
@@ -1852,116 +2385,146 @@ class MixpanelUtils(object):
             MixpanelUtils.LOGGER.warning(
                 "Event missing time or distinct_id property, dumping to invalid_events.txt"
             )
-            with open("invalid_events.txt", "a+", encoding="utf-8") as invalid:
-                json.dump(event, invalid)
-                invalid.write("\n")
-                return
-        event_copy = deepcopy(event)
+            self._append_to_failure_file("invalid_events.txt", event)
+            return
+        # Only time and token change, so copying the event and its properties dict is enough to leave the input as is
+        properties = event["properties"]
+        properties_copy = dict(properties)
         # transforms timestamp to UTC
-        event_copy["properties"]["time"] = int(
-            int(event["properties"]["time"]) - (timezone_offset * 3600)
-        )
-        event_copy["properties"]["token"] = token
+        event_time = properties["time"]
+        if type(event_time) is not int:
+            event_time = int(event_time)
+        event_time -= offset_seconds
+        properties_copy["time"] = event_time if type(event_time) is int else int(event_time)
+        properties_copy["token"] = token
+        event_copy = dict(event)
+        event_copy["properties"] = properties_copy
         return event_copy
 
     @staticmethod
-    def _prep_params_for_profile(
-            profile, token, operation, value, ignore_alias, dynamic
-    ):
+    def _prep_params_for_profile(profile, template, operation, value, dynamic):
         """Takes a People profile dict and returns the parameters for an /engage API update
 
         :param profile: A Mixpanel People profile dict
-        :param token: A Mixpanel project token
+        :param template: The parameters shared by every update in the operation, see _profile_update_template
         :param operation: A Mixpanel /engage API update operation
             https://mixpanel.com/help/reference/http#update-operations
         :param value: The value to use for the operation or a function that takes a People profile and returns the value
             to use
-        :param ignore_alias: Option to bypass Mixpanel's alias lookup table
         :param dynamic: Should be set to True if value param is a function, otherwise false.
         :type profile: dict
-        :type token: str
+        :type template: dict
         :type value: dict | list | str | (profile) -> dict | (profile) -> list
         :type operation: str
-        :type ignore_alias: bool
         :type dynamic: bool
         :return: Parameters for a Mixpanel /engage API update
         :rtype: dict
 
         """
-        # We use a dynamic flag parameter to avoid the overhead of checking the value parameter's type every time
-        if dynamic:
-            op_value = value(profile)
+        if "$distinct_id" in profile:
+            distinct_id = profile["$distinct_id"]
+        elif "distinct_id" in profile:
+            # If there's no $distinct_id, look for distinct_id instead (could be JQL data)
+            distinct_id = profile["distinct_id"]
         else:
-            op_value = value
+            MixpanelUtils.LOGGER.warning(
+                "Profile object does not contain a distinct id, skipping."
+            )
+            return
 
-        params = {
+        # We use a dynamic flag parameter to avoid the overhead of checking the value parameter's type every time
+        params = template.copy()
+        params[operation] = value(profile) if dynamic else value
+        params["$distinct_id"] = distinct_id
+        return params
+
+    @staticmethod
+    def _profile_update_template(token, ignore_alias):
+        """Returns the parameters that are the same for every /engage update in an operation
+
+        :param token: A Mixpanel project token
+        :param ignore_alias: Option to bypass Mixpanel's alias lookup table
+        :type token: str
+        :type ignore_alias: bool
+        :return: A dict to be copied for each profile update by _prep_params_for_profile
+        :rtype: dict
+
+        """
+        return {
             "$ignore_time": True,
             "$ip": 0,
             "$ignore_alias": ignore_alias,
             "$token": token,
-            operation: op_value,
         }
 
-        try:
-            params["$distinct_id"] = profile["$distinct_id"]
-        except KeyError:
-            try:
-                # If there's no $distinct_id, look for distinct_id instead (could be JQL data)
-                params["$distinct_id"] = profile["distinct_id"]
-            except KeyError:
-                MixpanelUtils.LOGGER.warning(
-                    "Profile object does not contain a distinct id, skipping."
-                )
-                return
-
-        return params
-
-    @staticmethod
-    def _dt_from_iso(profile):
-        """Takes a Mixpanel People profile and returns a datetime object for the $last_seen value or datetime.min if
-        $last_seen is not set
+    def _stream_jql_items_to_file(self, output_file, format, compress, data_type, **query_args):
+        """Streams the result of a JQL events or people query to disk. The output file is written from the start again
+        if the connection drops part way through the response
 
-        :param profile: A Mixpanel People profile dict
-        :type profile: dict
-        :return: A datetime representing the $last_seen value for the given profile
-        :rtype: datetime
+        :param output_file: Name of the file to write to
+        :param format: Data format for the output can be 'json' or 'csv'
+        :param compress: Optionally gzip the output file
+        :param data_type: Can be 'events' or 'people'
+        :param query_args: Keyword arguments for _query_jql_items
+        :type output_file: str
+        :type format: str
+        :type compress: bool
+        :type data_type: str
 
         """
-        dt = datetime.datetime.min
-        try:
-            last_seen = profile["$properties"]["$last_seen"]
+        for attempt in range(self.max_retries):
+            items = self._query_jql_items(data_type, format=format, stream=True, **query_args)
             try:
-                # Try to use the MUCH faster ciso8601 library, if it's not installed use the built-in datetime library
-                dt = ciso8601.parse_datetime_unaware(last_seen)
-            except NameError:
-                dt = datetime.datetime.strptime(last_seen, "%Y-%m-%dT%H:%M:%S")
-        except KeyError:
-            return dt
-        return dt
+                MixpanelUtils._export_jql_items(items, output_file, format=format, compress=compress)
+                return
+            except (urllib3.exceptions.HTTPError, ValueError) as e:
+                # A truncated body shows up as a read error or, for json, as an unterminated array
+                MixpanelUtils.LOGGER.error(f"Error reading JQL response: {e}")
+                MixpanelUtils.LOGGER.warning(f"Attempting retry #{attempt + 1}")
+
+        MixpanelUtils.LOGGER.error(
+            "Maximum retries reached. Request failed. Try again later."
+        )
+        raise BaseException
 
     @staticmethod
     def _export_jql_items(items, output_file, format="json", compress=False):
         """Based method for exporting jql events or jql people to disk
 
-        :param items: json list or csv data
+        :param items: json list or iterator, or csv data as a str or a file-like response
         :param output_file: Name of the file to write to
         :param format: Data format for the output can be 'json' or 'csv', should match the data type in items
         :param compress: Optionally gzip the output file
-        :type items: list | str
+        :type items: list | iterator | str | urllib3.response.HTTPResponse
         :type output_file: str
         :type format: str
         :type compress: bool
 
         """
+        if items is None:
+            MixpanelUtils.LOGGER.error(f"No JQL results to write to {output_file}")
+            return
         if format == "json":
             MixpanelUtils.export_data(
                 items, output_file, format=format, compress=compress
             )
         elif format == "csv":
-            with open(output_file, "w", encoding="utf-8") as f:
-                f.write(items)
+            # Compressed output is written through gzip directly rather than gzipping a finished file afterwards
             if compress:
-                MixpanelUtils._gzip_file(output_file)
+                if output_file[-3:] != ".gz":
+                    output_file = output_file + ".gz"
+                output = gzip.open(output_file, "wb", compresslevel=1)
+            else:
+                output = open(output_file, "wb")
+            with output:
+                if isinstance(items, str):
+                    output.write(items.encode("utf-8"))
+                else:
+                    # Streamed responses are copied to disk as they are read
+                    try:
+                        shutil.copyfileobj(items, output, 1 << 20)
+                    finally:
+                        items.release_conn()
         else:
             MixpanelUtils.LOGGER.error(
                 f"Invalid format must be either json or csv, got: {format}"
@@ -1978,7 +2541,7 @@ class MixpanelUtils(object):
 
         """
         response = self.request(self.formatted_api, ["engage"], params)
-        data = json.loads(response)
+        data = _json_loads(response)
         if "results" in data:
             return data
         else:
@@ -1986,65 +2549,106 @@ class MixpanelUtils(object):
             return
 
     def _dispatch_batches(
-            self, base_url, endpoint, item_list, prep_args, batch_size=2000
+            self, base_url, endpoint, item_list, prep_args, batch_size=2000, adaptive=False
     ):
         """Asynchronously sends batches of items to the /import, /engage, /import-events or /import-people Mixpanel API
         endpoints
 
         :param base_url: The base API url
         :param endpoint: Can be 'import', 'engage', '/import-events' or '/import-people'
-        :param item_list: List of Mixpanel event data or People updates
-        :param prep_args: List of arguments to be provided to the appropriate _prep method in addition to the profile or
-            event
+        :param item_list: List (or other iterable) of Mixpanel event data or People updates
+        :param prep_args: Tuple of arguments to be provided to the appropriate _prep method after the profile or event
+        :param batch_size: Number of items per request, or the upper bound on it when adaptive is True
+        :param adaptive: Start with small batches and grow them towards batch_size while requests are queuing up in
+            the write pool, shrinking them again once the pool catches up (Default value = False)
         :type base_url: str
         :type endpoint: str
         :type item_list: list
-        :type prep_args: list
+        :type prep_args: tuple
+        :type batch_size: int
+        :type adaptive: bool
+        :return: Number of items read from item_list
+        :rtype: int
 
         """
-        pool = ThreadPool(processes=self.pool_size)
+        # Updates make any cached /engage results stale
+        self.invalidate_engage_cache()
+        self._acquire_failure_files()
+
+        # At most max_in_flight batches are queued or being sent at once, so a fast producer can't pile up batches in
+        # memory faster than the API accepts them
+        max_in_flight = self.pool_size * 2
+        slots = threading.BoundedSemaphore(max_in_flight)
+
+        def on_done(future):
+            try:
+                MixpanelUtils._async_future_handler_callback(future)
+            finally:
+                slots.release()
+
+        def submit(batch):
+            slots.acquire()
+            try:
+                future = self._write_pool.submit(self._send_batch, base_url, endpoint, batch)
+            except BaseException:
+                slots.release()
+                raise
+            future.add_done_callback(on_done)
+            return future
+
+        in_flight = []
         batch = []
+        min_batch_size = min(50, batch_size)
+        current_batch_size = min_batch_size if adaptive else batch_size
 
         # Decide which _prep function to use based on the endpoint
         if endpoint == "import" or endpoint == "import-events":
-            prep_function = MixpanelUtils._prep_event_for_import
+            prep_function = self._prep_event_for_import
         elif endpoint == "engage" or endpoint == "import-people":
             prep_function = MixpanelUtils._prep_params_for_profile
         else:
             MixpanelUtils.LOGGER.error(
                 f'endpoint must be "import", "engage", "import-events" or "import-people", found: {endpoint}'
             )
+            self._release_failure_files()
             return
 
-        for item in item_list:
-            if prep_args is not None:
-                # Insert the given item as the first argument to be passed to the _prep function determined above
-                prep_args[0] = item
-                params = prep_function(*prep_args)
-                if params:
-                    batch.append(params)
-            else:
-                batch.append(item)
-
-            if len(batch) == batch_size:
-                # Add an asynchronous call to _send_batch to the thread pool
-                pool.apply_async(
-                    self._send_batch,
-                    args=(base_url, endpoint, batch),
-                    callback=MixpanelUtils._async_response_handler_callback,
-                )
-                batch = []
-
-        # If there are fewer than 50 updates left ensure one last call is made
-        if len(batch):
-            # Add an asynchronous call to _send_batch to the thread pool
-            pool.apply_async(
-                self._send_batch,
-                args=(base_url, endpoint, batch),
-                callback=MixpanelUtils._async_response_handler_callback,
-            )
-        pool.close()
-        pool.join()
+        item_count = 0
+        try:
+            for item_count, item in enumerate(item_list, 1):
+                if prep_args is not None:
+                    params = prep_function(item, *prep_args)
+                    if params:
+                        batch.append(params)
+                else:
+                    batch.append(item)
+
+                if len(batch) >= current_batch_size:
+                    # Add an asynchronous call to _send_batch to the thread pool
+                    future = submit(batch)
+                    batch = []
+
+                    if adaptive:
+                        # A full backlog means per-request overhead dominates, so send fewer, larger batches; once the
+                        # pool has caught up, go back to smaller batches to keep latency low
+                        in_flight = [f for f in in_flight if not f.done()]
+                        in_flight.append(future)
+                        if len(in_flight) >= max_in_flight:
+                            current_batch_size = min(current_batch_size * 2, batch_size)
+                        elif len(in_flight) <= self.pool_size:
+                            current_batch_size = max(current_batch_size // 2, min_batch_size)
+
+            # If there are fewer than 50 updates left ensure one last call is made
+            if len(batch):
+                submit(batch)
+        finally:
+            # Wait for the batches already handed to the write pool even if reading item_list failed part way, so
+            # nothing is still writing to the failure files when they are closed. Every slot is free again once all
+            # batches have been sent and their callbacks have run
+            for _ in range(max_in_flight):
+                slots.acquire()
+            self._release_failure_files()
+        return item_count
 
     def _send_batch(
             self, base_url, endpoint, batch, retries=0,
@@ -2053,7 +2657,8 @@ class MixpanelUtils(object):
 
         :param base_url: The base API url
         :param endpoint: Can be 'import', 'engage', 'import-events' or 'import-people'
-        :param batch: List of Mixpanel event data or People updates to import.
+        :param batch: List of Mixpanel event data or People updates to import. Items that are already serialized JSON
+            bytes are sent without being encoded again
         :param retries:  Max number of times to retry if we get a HTTP 5xx response (Default value = 0)
         :type base_url: str
         :type endpoint: str
@@ -2064,25 +2669,87 @@ class MixpanelUtils(object):
 
         """
         try:
-            data = json.dumps(batch).encode("utf-8")
-            if endpoint != "import":
-                data = base64.b64encode(data)
+            serialized = isinstance(batch[0], (bytes, bytearray))
+            if endpoint == "import":
+                # /import accepts gzipped newline-delimited JSON; level 1 keeps the CPU cost low since sending the
+                # batch is network-bound anyway
+                buffer = io.BytesIO()
+                with gzip.GzipFile(fileobj=buffer, mode="wb", compresslevel=1) as gz:
+                    for item in batch:
+                        gz.write(item if serialized else _json_dumps_bytes(item))
+                        gz.write(b"\n")
+                data = buffer.getvalue()
+            elif serialized:
+                data = base64.b64encode(b"[" + b",".join(batch) + b"]")
+            else:
+                # orjson (when installed) serialises straight to compact utf-8 bytes, skipping the intermediate str
+                data = base64.b64encode(_json_dumps_bytes(batch))
             params = {"data": data}
             response = self.request(
                 base_url, [endpoint], params, "POST", retries=retries
             )
-            MixpanelUtils.LOGGER.debug(
-                f"Sent {len(batch)} items on {time.strftime('%Y-%m-%d %H:%M:%S')}!"
-            )
+            if MixpanelUtils.LOGGER.isEnabledFor(logging.DEBUG):
+                MixpanelUtils.LOGGER.debug(
+                    "Sent %d items on %s!", len(batch), time.strftime("%Y-%m-%d %H:%M:%S")
+                )
             return response
         except Exception:
             MixpanelUtils.LOGGER.error(
                 "Failed to import batch, dumping to file import_backup.txt",
                 exc_info=True,
             )
-            with open("import_backup.txt", "a+", encoding="utf-8") as backup:
-                json.dump(batch, backup)
-                backup.write("\n")
+            self._append_to_failure_file("import_backup.txt", batch)
+
+    def _append_to_failure_file(self, filename, item):
+        """Appends an item as a line of JSON to one of the files used to dump data that could not be imported. The file
+        is opened on first use and kept open until every running import has finished, see _release_failure_files
+
+        :param filename: Name of the file to append to
+        :param item: A JSON serializable item, or a batch of already serialized JSON bytes records
+        :type filename: str
+        :type item: dict | list
+
+        """
+        if isinstance(item, list) and item and isinstance(item[0], (bytes, bytearray)):
+            # Pre-serialized records can't go through the JSON encoder, they are joined into a JSON array as they are
+            line = "[" + ",".join(record.decode("utf-8") for record in item) + "]\n"
+        else:
+            line = _json_dumps(item) + "\n"
+        with self._failure_files_lock:
+            failure_file = self._failure_files.get(filename)
+            if failure_file is None:
+                failure_file = self._failure_files[filename] = open(filename, "a+", encoding="utf-8")
+            failure_file.write(line)
+
+    def _acquire_failure_files(self):
+        """Registers a running import as a user of the shared failure file handles, must be paired with a call to
+        _release_failure_files
+
+        """
+        with self._failure_files_lock:
+            self._failure_files_users += 1
+
+    def _release_failure_files(self):
+        """Unregisters a running import and closes the failure files once no other import on this object is still
+        writing to them
+
+        """
+        with self._failure_files_lock:
+            self._failure_files_users -= 1
+            if self._failure_files_users <= 0:
+                self._failure_files_users = 0
+                self._close_failure_files_locked()
+
+    def _close_failure_files(self):
+        """Flushes and closes any files opened by _append_to_failure_file"""
+        with self._failure_files_lock:
+            self._close_failure_files_locked()
+
+    def _close_failure_files_locked(self):
+        """Closes the failure files, the caller must hold _failure_files_lock"""
+        for failure_file in self._failure_files.values():
+            failure_file.close()
+        self._failure_files.clear()
 
     def _import_data(
             self,
@@ -2097,6 +2764,9 @@ class MixpanelUtils(object):
         """Base method to import either event data or People profile data as a list of dicts or from a JSON array
         file
 
+        Files are read and sent batch by batch, so a malformed record part way through a file raises after the batches
+        read before it were already imported. Those are not rolled back, fix the file and import the remaining records.
+
         :param data: A list of event or People profile dicts or the name of a file containing a JSON array or CSV of
             events or People profiles
         :param endpoint: can be 'import' or 'engage'
@@ -2113,23 +2783,41 @@ class MixpanelUtils(object):
         """
         assert self.token, "Project token required for import!"
 
-        # Create a list of arguments to be used in one of the _prep functions later
-        args = [{}, self.token]
-
-        item_list = MixpanelUtils._list_from_argument(data)
-        if not raw_record_import:
-            if endpoint == "import" or endpoint == "import-events":
-                args.append(timezone_offset)
-            elif endpoint == "engage" or endpoint == "import-people":
-                args.extend(
-                    ["$set", lambda profile: profile["$properties"], ignore_alias, True]
-                )
+        # Arguments passed to one of the _prep functions after each item
+        if isinstance(data, str):
+            # Files are read lazily so imports of large files don't have to hold every item in memory
+            item_list = MixpanelUtils._iter_from_items_filename(data)
         else:
+            item_list = MixpanelUtils._list_from_argument(data)
+        if raw_record_import:
             args = None
+        elif endpoint == "import" or endpoint == "import-events":
+            # The offset is converted to seconds once here rather than for every event
+            offset_seconds = timezone_offset * 3600
+            if offset_seconds == int(offset_seconds):
+                offset_seconds = int(offset_seconds)
+            args = (self.token, offset_seconds)
+        elif endpoint == "engage" or endpoint == "import-people":
+            args = (
+                MixpanelUtils._profile_update_template(self.token, ignore_alias),
+                "$set",
+                lambda profile: profile["$properties"],
+                True,
+            )
+        else:
+            args = (self.token,)
 
-        self._dispatch_batches(
-            base_url, endpoint, item_list, args, batch_size=batch_size
-        )
+        try:
+            self._dispatch_batches(
+                base_url, endpoint, item_list, args, batch_size=batch_size
+            )
+        except ValueError:
+            if isinstance(data, str):
+                # _dispatch_batches has waited for the batches already sent, so the import really stops here
+                MixpanelUtils.LOGGER.error(
+                    f"Stopped importing {data} at a malformed record, records read before it may already be imported"
+                )
+            raise
 
     def _query_jql_items(
             self,
@@ -2141,6 +2829,7 @@ class MixpanelUtils(object):
             output_properties=None,
             timezone_offset=0,
             format="json",
+            stream=False,
     ):
         """Base method for querying jql for events or People
 
@@ -2156,6 +2845,7 @@ class MixpanelUtils(object):
         :param timezone_offset: UTC offset in hours of export project timezone setting. If set, used to convert event
             timestamps from project time to UTC. Only used when data_type='events'
         :param format: Data format for the output can be either 'json' or 'csv'
+        :param stream: Stream the results, see query_jql (Default value = False)
         :type data_type: str
         :type from_date: datetime | str
         :type to_date: datetime | str
@@ -2164,6 +2854,7 @@ class MixpanelUtils(object):
         :type output_properties: list[str]
         :type timezone_offset: float | int
         :type format: str
+        :type stream: bool
 
         """
 
@@ -2231,7 +2922,7 @@ class MixpanelUtils(object):
         if output_properties is not None:
             params["output_properties"] = output_properties
 
-        return self.query_jql(jql_script, params=params, format=format)
+        return self.query_jql(jql_script, params=params, format=format, stream=stream)
 
     def _create_merge_event(self, event):
         return {
@@ -2246,45 +2937,13 @@ class MixpanelUtils(object):
             }
         }
 
-    def _map_amplitude_property_to_mixpanel(self, property_name):
-        amplitude_to_mixpanel_map = {
-            "app_version": "$app_version_string",
-            "os_name": "$os",
-            "os_version": "$os_version",
-            "device_brand": "$brand",
-            "device_manufacturer": "$manufacturer",
-            "device_model": "$model",
-            "carrier": "$carrier",
-            "region": "$region",
-            "city": "$city",
-            "insert_id": "$insert_id",
-            "$insert_id": "$insert_id",
-            "platform": "platform",
-            "dma": "dma",
-            "language": "language",
-            "price": "price",
-            "quantity": "quantity",
-            "revenue": "revenue",
-            "productId": "productId",
-            "revenueType": "revenueType",
-            "location_lat": "location_lat",
-            "location_lng": "location_lng",
-            "idfa": "idfa",
-            "idfv": "idfv",
-            "adid": "adid",
-            "android_id": "android_id",
-            "event_id": "event_id",
-            "session_id": "session_id",
-            "plan": "plan"
-        }
-        return amplitude_to_mixpanel_map.get(property_name)
-
     def _transform_amplitude_profiles(self, amplitude_profile):
         properties = amplitude_profile["user_properties"]
-        default_properties = {self._map_amplitude_property_to_mixpanel(key): value for key, value in
-                              amplitude_profile.items() if self._map_amplitude_property_to_mixpanel(key)}
-        if amplitude_profile["user_properties"]["Name"]:
-            default_properties["$name"] = amplitude_profile["user_properties"]["Name"]
+        default_properties = {_AMP_TO_MP[key]: value for key, value in amplitude_profile.items() if
+                              key in _AMP_TO_MP}
+        name = properties["Name"]
+        if name:
+            default_properties["$name"] = name
         profile = {
             "$token": self.token,
             "$distinct_id": amplitude_profile["user_id"],
@@ -2295,12 +2954,12 @@ class MixpanelUtils(object):
         return profile
 
     def _format_amplitude_time(self, event_time):
-        for date_format in ('%Y-%m-%d %H:%M:%S', '%Y-%m-%d %H:%M:%S.%f'):
-            try:
-                return datetime.datetime.strptime(event_time, date_format)
-            except ValueError:
-                pass
-        raise ValueError('No valid date format found')
+        # Amplitude timestamps ('%Y-%m-%d %H:%M:%S' with optional fractional seconds) are ISO 8601, so they go through
+        # the same fast parser as every other timestamp instead of strptime
+        try:
+            return _parse_datetime(event_time)
+        except ValueError:
+            raise ValueError('No valid date format found')
 
     def _transform_amplitude_events(self, amplitude_event):
         event_dt = self._format_amplitude_time(amplitude_event["event_time"])
@@ -2316,17 +2975,18 @@ class MixpanelUtils(object):
         }
 
         default_properties = {
-            self._map_amplitude_property_to_mixpanel(key): value for key, value in amplitude_event.items()
-            if self._map_amplitude_property_to_mixpanel(key)
+            _AMP_TO_MP[key]: value for key, value in amplitude_event.items() if key in _AMP_TO_MP
         }
         if "$insert_id" in default_properties:
             default_properties["$insert_id"] = re.sub(r"[^a-zA-Z0-9-]", "", default_properties["$insert_id"])
 
-        combined_properties = {**mixpanel_properties, **amplitude_event["event_properties"], **default_properties}
+        # mixpanel_properties is built per event, so it is extended in place; later updates take precedence
+        mixpanel_properties.update(amplitude_event["event_properties"])
+        mixpanel_properties.update(default_properties)
 
         event = {
             "event": amplitude_event["event_type"],
-            "properties": combined_properties
+            "properties": mixpanel_properties
         }
 
         return event
@@ -2347,17 +3007,18 @@ class MixpanelUtils(object):
         }
 
         default_properties = {
-            self._map_amplitude_property_to_mixpanel(key): value for key, value in amplitude_event.items()
-            if self._map_amplitude_property_to_mixpanel(key)
+            _AMP_TO_MP[key]: value for key, value in amplitude_event.items() if key in _AMP_TO_MP
         }
         if "$insert_id" in default_properties:
             default_properties["$insert_id"] = re.sub(r"[^a-zA-Z0-9-]", "", default_properties["$insert_id"])
 
-        combined_properties = {**mixpanel_properties, **amplitude_event["event_properties"], **default_properties}
+        # mixpanel_properties is built per event, so it is extended in place; later updates take precedence
+        mixpanel_properties.update(amplitude_event["event_properties"])
+        mixpanel_properties.update(default_properties)
 
         event = {
             "event": amplitude_event["event_type"],
-            "properties": combined_properties
+            "properties": mixpanel_properties
         }
 
         return event
@@ -2365,75 +3026,47 @@ class MixpanelUtils(object):
     def _dedupe_merge_events(self, merge_events):
         unique_merge_events = {}
         for event in merge_events:
-            merge_pair = (event["properties"]["$distinct_ids"][0], event["properties"]["$distinct_ids"][1])
-            if not unique_merge_events.get(merge_pair):
-                unique_merge_events[merge_pair] = event
+            distinct_ids = event["properties"]["$distinct_ids"]
+            # The first merge event seen for each pair of ids is kept
+            unique_merge_events.setdefault((distinct_ids[0], distinct_ids[1]), event)
 
         return list(unique_merge_events.values())
 
     def _extract_amplitude_data(self, url, credentials):
         zip_file_path = "./amp_data.zip"
-        data_parent_path = "./amp_data"
-        extract_path = f"{data_parent_path}/amplitude_extract"
         req = urllib.request.Request(url)
         encoded_credentials = base64.b64encode(credentials.encode('ascii'))
         req.add_header('Authorization', 'Basic %s' % encoded_credentials.decode("ascii"))
 
         try:
             # Download zip file
-            response = urllib.request.urlopen(req)
-            with open(zip_file_path, "wb") as zip_file:
-                zip_file.write(response.read())
+            # The export is streamed to disk in chunks rather than read into memory whole
+            with urllib.request.urlopen(req) as response, open(zip_file_path, "wb") as zip_file:
+                shutil.copyfileobj(response, zip_file, 1 << 20)
 
-            # Unzip file
-            with zipfile.ZipFile(zip_file_path, "r") as zip_ref:
-                zip_ref.extractall(data_parent_path)
-
-            data_path = next(os.walk(data_parent_path))[1][0]
-            full_data_path = os.path.join(data_parent_path, data_path)
-
-            extracted_event_count = 0
-
-            # Parse all .gz data files into json files
-            for filename in os.listdir(full_data_path):
-                if filename[-3:] == ".gz":
-                    with gzip.open(os.path.join(full_data_path, filename), 'rb') as f:
-                        events = []
-                        for line in f:
-                            events.append(json.loads(line))
-                        extracted_event_count += len(events)
-                        os.makedirs(extract_path, exist_ok=True)
-                        with open(os.path.join(extract_path, filename[:-3]), "w") as extract_file:
-                            extract_file.write(json.dumps(events))
-
-            return extract_path
+            # The gzipped newline delimited JSON files are streamed out of the zip by the transform step, so nothing is
+            # extracted to disk
+            return zip_file_path
         except Exception as e:
             MixpanelUtils.LOGGER.error(
                 "Error extracting data from Amplitude", exc_info=True
             )
             raise e
 
-    def _transform_and_load_amplitude_data(self, extract_data_path):
-        transform_data_path = "./amp_data/amplitude_transform"
-        try:
-            total_events = 0
-            for filename in os.listdir(extract_data_path):
-                all_events = []
-                with open(os.path.join(extract_data_path, filename), "r") as extract_file:
-                    all_events = json.loads(extract_file.read())
-
-                transformed_profiles = [self._transform_amplitude_profiles(profile) for profile in all_events if
-                                        profile["user_properties"]]
-                transformed_events = [self._transform_amplitude_events(event) for event in all_events]
-                merge_events = [self._create_merge_event(event) for event in all_events if
-                                event.get("user_id") and event.get("amplitude_id")]
+    def _transform_and_load_amplitude_data(self, zip_file_path):
+        self._load_amplitude_files(zip_file_path, self._transform_and_load_amplitude_file)
 
-                unique_merge_events = self._dedupe_merge_events(merge_events)
+    def _transform_and_load_amplitude_data_id_mgmt_v3(self, zip_file_path):
+        self._load_amplitude_files(zip_file_path, self._transform_and_load_amplitude_file_id_mgmt_v3)
 
-                self.import_people(transformed_profiles)
-                self.import_events(transformed_events, 0)
-                self.import_events(unique_merge_events, 0)
-                total_events += len(all_events)
+    def _load_amplitude_files(self, zip_file_path, load_file):
+        # The exported files are independent of each other, so they are transformed and imported concurrently. Peak
+        # memory is roughly read_pool_size decoded files (the raw events plus their transformed copies) and the
+        # pool_size * 2 batches each running import keeps in flight
+        try:
+            with zipfile.ZipFile(zip_file_path, "r") as zip_ref:
+                names = [name for name in zip_ref.namelist() if name[-3:] == ".gz"]
+            total_events = sum(self._read_pool.map(lambda name: load_file(zip_file_path, name), names))
 
             print(f"Imported {total_events} events")
 
@@ -2443,41 +3076,58 @@ class MixpanelUtils(object):
             )
             return
 
-    def _transform_and_load_amplitude_data_id_mgmt_v3(self, extract_data_path):
-        transform_data_path = "./amp_data/amplitude_transform"
-        try:
-            total_events = 0
-            for filename in os.listdir(extract_data_path):
-                all_events = []
-                with open(
-                    os.path.join(extract_data_path, filename), "r"
-                ) as extract_file:
-                    all_events = json.loads(extract_file.read())
-
-                transformed_profiles = [
-                    self._transform_amplitude_profiles(profile)
-                    for profile in all_events
-                    if profile["user_properties"]
-                ]
-                transformed_events = [
-                    self._transform_amplitude_events_id_mgmt_v3(event) for event in all_events
-                ]
-
-                unique_merge_events = [
-                    self._create_merge_event(event)
-                    for event in all_events
-                    if event.get("user_id") and event.get("amplitude_id")
-                ]
-
-                self.import_people(transformed_profiles)
-                self.import_events(transformed_events, 0)
-                self.import_events(unique_merge_events, 0)
-                total_events += len(all_events)
+    @staticmethod
+    def _read_amplitude_file(zip_file_path, name):
+        # Amplitude exports are gzipped newline delimited JSON, decompressed straight out of the zip while they are
+        # read. Each call opens its own ZipFile so files can be read from several threads at once
+        with zipfile.ZipFile(zip_file_path, "r") as zip_ref, zip_ref.open(name) as raw:
+            with gzip.open(raw, "rb") as extract_file:
+                return [_json_loads(line) for line in extract_file if not line.isspace()]
+
+    def _transform_and_load_amplitude_file(self, zip_file_path, name):
+        all_events = self._read_amplitude_file(zip_file_path, name)
+
+        transformed_profiles, transformed_events, merge_events = self._transform_amplitude_file_events(
+            all_events, self._transform_amplitude_events
+        )
 
-            print(f"Imported {total_events} events")
+        unique_merge_events = self._dedupe_merge_events(merge_events)
 
-        except:
-            MixpanelUtils.LOGGER.error(
-                "Error transforming Amplitude data", exc_info=True
-            )
-            return
+        self._import_amplitude_data(transformed_profiles, transformed_events, unique_merge_events)
+        return len(all_events)
+
+    def _transform_and_load_amplitude_file_id_mgmt_v3(self, zip_file_path, name):
+        all_events = self._read_amplitude_file(zip_file_path, name)
+
+        transformed_profiles, transformed_events, unique_merge_events = self._transform_amplitude_file_events(
+            all_events, self._transform_amplitude_events_id_mgmt_v3
+        )
+
+        self._import_amplitude_data(transformed_profiles, transformed_events, unique_merge_events)
+        return len(all_events)
+
+    def _transform_amplitude_file_events(self, all_events, transform_event):
+        # A single pass builds the events and merge events for the file; the methods and list appends are bound to
+        # locals once since this runs for every Amplitude event
+        profile_events = {}
+        events = []
+        merge_events = []
+        create_merge_event = self._create_merge_event
+        add_event = events.append
+        add_merge_event = merge_events.append
+        for event in all_events:
+            if event["user_properties"]:
+                # Every event carries a snapshot of the user's properties, so only the latest one per user is imported
+                profile_events[event["user_id"]] = event
+            add_event(transform_event(event))
+            if event.get("user_id") and event.get("amplitude_id"):
+                add_merge_event(create_merge_event(event))
+        profiles = [self._transform_amplitude_profiles(event) for event in profile_events.values()]
+        return profiles, events, merge_events
+
+    def _import_amplitude_data(self, profiles, events, merge_events):
+        # The imports run one after another: this already runs on a _read_pool thread next to the other files, and each
+        # import keeps the shared _write_pool busy with its own batches
+        self.import_people(profiles)
+        self.import_events(events, 0)
+        self.import_events(merge_events, 0)
@@ -39,10 +39,12 @@ class ConcurrentPaginator(object):
     pagination.
     """
 
-    def __init__(self, get_func, concurrency=20):
+    def __init__(self, get_func, concurrency=20, executor=None):
         """
         Initialize with a function that fetches a page of results.
         `concurrency` controls the number of threads used to fetch pages.
+        An existing `concurrent.futures.Executor` may be passed via `executor`
+        to reuse its threads instead of starting a new pool per fetch.
 
         Example:
             client = MixpanelQueryClient(...)
@@ -50,6 +52,7 @@ class ConcurrentPaginator(object):
         """
         self.get_func = get_func
         self.concurrency = concurrency
+        self.executor = executor
 
     def fetch_all(self, params=None):
         """
@@ -68,6 +71,31 @@ class ConcurrentPaginator(object):
         fetcher = self._results_fetcher(params)
         return results + self._concurrent_flatmap(fetcher, list(range(start, end)))
 
+    def iter_pages(self, params=None):
+        """
+        Lazily yield the results of each page, in page order.
+
+        Unlike `fetch_all`, the caller can start consuming the first pages
+        while the remaining ones are still being fetched.
+        """
+        params = params and params.copy() or {}
+
+        first_page = self.get_func(params)
+        yield first_page["results"]
+        params["session_id"] = first_page["session_id"]
+
+        start, end = self._remaining_page_range(first_page)
+        fetcher = self._results_fetcher(params)
+        if self.executor is not None:
+            yield from self.executor.map(fetcher, range(start, end))
+            return
+        pool = ThreadPool(processes=self.concurrency)
+        try:
+            yield from pool.imap(fetcher, range(start, end))
+        finally:
+            pool.close()
+            pool.join()
+
     def _results_fetcher(self, params):
         def _fetcher_func(page):
             req_params = dict(list(params.items()) + [("page", page)])
@@ -76,6 +104,8 @@ class ConcurrentPaginator(object):
         return _fetcher_func
 
     def _concurrent_flatmap(self, func, iterable):
+        if self.executor is not None:
+            return list(itertools.chain(*self.executor.map(func, iterable)))
         pool = ThreadPool(processes=self.concurrency)
         res = list(itertools.chain(*pool.map(func, iterable)))
         pool.close()